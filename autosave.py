@@ -0,0 +1,154 @@
+import queue
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundWriter:
+    """
+    Moves disk work off the Tk main thread.
+
+    submit() queues keyed writes: they run one at a time, in submission
+    order, on a dedicated writer thread, and a newer job for a key that is
+    still waiting replaces the older one (so a burst of saves for the same
+    target collapses into one write). run() hands unordered work such as
+    image decoding to a small thread pool. Completion callbacks are always
+    called back on the Tk thread, via root.after polling.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, root, workers=2):
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self._cond = threading.Condition()
+        self._order = deque()
+        self._pending = {}
+        self._busy = False
+        self._closed = False
+        self._done = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="diary-writer", daemon=True)
+        self._thread.start()
+        self._poll_after = self.root.after(self.POLL_MS, self._poll)
+
+    def submit(self, key, fn, on_done=None):
+        with self._cond:
+            if key not in self._pending:
+                self._order.append(key)
+            self._pending[key] = (fn, on_done)
+            self._cond.notify_all()
+
+    def run(self, fn, on_done=None):
+        future = self.pool.submit(fn)
+        future.add_done_callback(lambda f: self._finish(f.result, on_done))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._order and not self._closed:
+                    self._cond.wait()
+                if not self._order:
+                    return
+                key = self._order.popleft()
+                fn, on_done = self._pending.pop(key)
+                self._busy = True
+            self._finish(fn, on_done)
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _finish(self, fn, on_done):
+        try:
+            result = fn()
+        except Exception:
+            traceback.print_exc()
+            return
+        if on_done:
+            self._done.put((on_done, result))
+
+    def _drain(self):
+        while True:
+            try:
+                on_done, result = self._done.get_nowait()
+            except queue.Empty:
+                return
+            on_done(result)
+
+    def _poll(self):
+        self._drain()
+        self._poll_after = self.root.after(self.POLL_MS, self._poll)
+
+    def flush(self):
+        """Block until every queued write has hit the disk."""
+        with self._cond:
+            while self._order or self._busy:
+                self._cond.wait()
+
+    def close(self):
+        # Completion callbacks may queue follow-up writes (e.g. recording a saved
+        # file on its entry), so keep flushing until nothing is left
+        self.root.after_cancel(self._poll_after)
+        self.pool.shutdown(wait=True)
+        self.flush()
+        while not self._done.empty():
+            self._drain()
+            self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+class WriteBehindStorage:
+    """
+    Wraps a storage backend so put() returns immediately: the entry is
+    visible to get()/month_colors() at once and written by the
+    BackgroundWriter, coalescing repeated saves of the same date.
+    """
+
+    def __init__(self, storage, writer):
+        self.storage = storage
+        self.writer = writer
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def get(self, date_str):
+        with self._lock:
+            if date_str in self._pending:
+                return dict(self._pending[date_str])
+        return self.storage.get(date_str)
+
+    def put(self, date_str, entry):
+        with self._lock:
+            self._pending[date_str] = dict(entry)
+        self.writer.submit(("entry", date_str), lambda: self._write(date_str))
+
+    def _write(self, date_str):
+        with self._lock:
+            entry = self._pending[date_str]
+        self.storage.put(date_str, entry)
+        with self._lock:
+            if self._pending.get(date_str) is entry:
+                del self._pending[date_str]
+
+    def month_colors(self, year, month):
+        colors = self.storage.month_colors(year, month)
+        prefix = f"{year}-{month:02d}-"
+        with self._lock:
+            for date_str, entry in self._pending.items():
+                if date_str.startswith(prefix):
+                    if entry.get("color"):
+                        colors[date_str] = entry["color"]
+                    else:
+                        colors.pop(date_str, None)
+        return colors
+
+    def items(self):
+        self.writer.flush()
+        return self.storage.items()
+
+    def close(self):
+        self.writer.flush()
+        self.storage.close()
+
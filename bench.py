@@ -0,0 +1,399 @@
+"""
+Benchmarks for the diary's hot paths, reported as JSON.
+
+    python bench.py                          # everything, results on stdout
+    python bench.py -o before.json           # save results
+    python bench.py -o after.json --compare before.json
+
+Storage, gradient, layer and undo benchmarks need no display. The
+benchmarks that drive the real Tk widgets (calendar, gradient frames,
+DrawingWindow) need one: run under Xvfb (xvfb-run python bench.py) or on
+a desktop, where their windows are created withdrawn. Without a display
+they are listed under "skipped".
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from storage import open_storage, STORAGE_BACKENDS
+
+WORDS = ("today", "walked", "rain", "coffee", "friend", "work", "tired", "happy", "cooked", "read",
+         "ramen", "park", "train", "music", "garden", "letter", "sleep", "cat", "晴れ", "散歩", "😊")
+
+
+class Bench:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+        self.skipped = []
+
+    def time(self, name, fn, setup=None, per=1, repeat=None, **params):
+        """Run fn repeatedly (setup untimed before each run); per divides each timing, e.g. per event."""
+        times = []
+        for _ in range(repeat or self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) / per)
+        self.add(name, params, times=times)
+
+    def add(self, name, params, times=None, **values):
+        result = {"name": name, "params": params}
+        if times:
+            result.update(runs=len(times), min_ms=min(times) * 1000, median_ms=statistics.median(times) * 1000,
+                          mean_ms=statistics.fmean(times) * 1000)
+        result.update(values)
+        self.results.append(result)
+        print(f"  {name} {params}: " + (f"{result['median_ms']:.3f} ms" if times else json.dumps(values)[:80]),
+              file=sys.stderr)
+
+    def skip(self, name, reason):
+        self.skipped.append({"name": name, "reason": reason})
+        print(f"  {name}: skipped ({reason})", file=sys.stderr)
+
+
+def synthetic_entries(count, seed=1):
+    rng = random.Random(seed)
+    today = date(2025, 1, 1)
+    entries = {}
+    for i in range(count):
+        entry = {"text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))),
+                 "color": rng.choice(("green", "yellow", "red", ""))}
+        entries[(today - timedelta(days=i)).isoformat()] = entry
+    return entries
+
+
+def write_legacy_diary(entries_dir, entries):
+    os.makedirs(entries_dir, exist_ok=True)
+    with open(os.path.join(entries_dir, "diary_data.json"), "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+
+
+# ---------------- Headless ----------------
+def bench_storage(bench, sizes, workdir):
+    for size in sizes:
+        entries = synthetic_entries(size)
+        dates = sorted(entries)
+        for kind in STORAGE_BACKENDS:
+            entries_dir = os.path.join(workdir, f"{kind}_{size}", "entries")
+            write_legacy_diary(entries_dir, entries)
+
+            start = time.perf_counter()
+            open_storage(kind, entries_dir).close()  # first open imports diary_data.json
+            bench.add("storage_import", {"backend": kind, "entries": size},
+                      times=[time.perf_counter() - start])
+
+            # load_data: opening an existing diary
+            bench.time("storage_open", lambda: open_storage(kind, entries_dir).close(),
+                       backend=kind, entries=size)
+
+            storage = open_storage(kind, entries_dir)
+            puts = 5 if kind == "json" else 50
+            rng = random.Random(size)
+
+            def put_many():
+                for _ in range(puts):
+                    date_str = rng.choice(dates)
+                    storage.put(date_str, dict(entries[date_str], text=entries[date_str]["text"] + " edited"))
+
+            # save_data_to_file: one entry rewritten
+            bench.time("storage_put", put_many, per=puts, backend=kind, entries=size)
+            year = int(dates[-1][:4])
+            bench.time("storage_month_colors", lambda: storage.month_colors(year, 6), backend=kind, entries=size)
+            bench.time("storage_get", lambda: storage.get(dates[len(dates) // 2]), backend=kind, entries=size)
+            storage.close()
+            shutil.rmtree(os.path.dirname(entries_dir))
+
+
+def bench_gradient(bench):
+    from gradients import render_gradient
+    for width, height in ((900, 600), (1920, 1080), (3840, 2160)):
+        bench.time("render_gradient", lambda: render_gradient((255, 182, 193), (173, 216, 230), width, height),
+                   width=width, height=height)
+
+
+def random_layer(size, rng, strokes=40):
+    from PIL import Image, ImageDraw
+    from layers import TiledLayer
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for _ in range(strokes):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        r = rng.randint(5, 60)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256), 255))
+    return TiledLayer.from_image(image)
+
+
+def bench_layers(bench, layer_counts):
+    from PIL import Image
+    rng = random.Random(7)
+    for size in ((600, 400), (1920, 1080)):
+        layers = [random_layer(size, rng) for _ in range(max(layer_counts))]
+        for count in layer_counts:
+            def composite_full():
+                dest = Image.new("RGBA", size, (255, 255, 255, 255))
+                for layer in reversed(layers[:count]):
+                    layer.composite_into(dest)
+
+            def composite_dirty():
+                dest = Image.new("RGBA", (64, 64), (255, 255, 255, 255))
+                for layer in reversed(layers[:count]):
+                    layer.composite_into(dest, (100, 100, 164, 164))
+
+            bench.time("layers_composite_full", composite_full, layers=count, width=size[0], height=size[1])
+            bench.time("layers_composite_dirty", composite_dirty, layers=count, width=size[0], height=size[1])
+
+
+def bench_fill(bench):
+    from PIL import Image, ImageDraw
+    from fill import flood_fill_mask
+    from layers import TiledLayer
+    for width, height in ((600, 400), (1920, 1080), (3840, 2160)):
+        image = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+        draw = ImageDraw.Draw(image)
+        for x in range(0, width, width // 12):
+            draw.ellipse((x, height // 4, x + width // 20, height // 2), outline=(0, 0, 0, 255), width=3)
+        for alpha in (False, True):
+            bench.time("flood_fill", lambda: flood_fill_mask(image, (1, 1), 32, alpha),
+                       width=width, height=height, source="layer" if alpha else "merged")
+
+        # The Fill tool end to end on the active layer, minus the Tk display update:
+        # sample, mask, paint the region, write its tiles, re-composite the bbox
+        below = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+        for name, painted in (("empty", {}), ("drawn", TiledLayer.from_image(image).tiles)):
+            def fill_layer():
+                tiles = TiledLayer((width, height), dict(painted))
+                mask, bbox = flood_fill_mask(tiles.to_image(), (1, 1), 32, True)
+                region = tiles.crop(bbox)
+                region.paste(Image.new("RGBA", region.size, (255, 0, 0, 255)), (0, 0), mask)
+                tiles.write(region, bbox[:2])
+                composite = below.crop(bbox)
+                tiles.composite_into(composite, bbox)
+
+            bench.time("fill_layer", fill_layer, width=width, height=height, layer=name)
+
+
+def bench_undo_memory(bench, strokes):
+    from PIL import Image, ImageDraw
+    from layers import TiledLayer
+    from history import History, StrokeOp
+    rng = random.Random(3)
+    for budget_mb in (64, 1024):
+        layer = {'name': "Layer", 'tiles': TiledLayer((1920, 1080))}
+        history = History(budget_mb * 1024 * 1024)
+        series = []
+        tracemalloc.start()
+        for i in range(1, strokes + 1):
+            before = layer['tiles'].snapshot()
+            x0, y0 = rng.randrange(1800), rng.randrange(1000)
+            region = Image.new("RGBA", (120, 80), (0, 0, 0, 0))
+            ImageDraw.Draw(region).line((0, rng.randrange(80), 119, rng.randrange(80)), fill=(0, 0, 0, 255), width=5)
+            layer['tiles'].write(region, (x0, y0))
+            changed = layer['tiles'].changed_tiles(before)
+            history.push(StrokeOp(layer, {k: before.get(k) for k in changed},
+                                  {k: layer['tiles'].tiles.get(k) for k in changed}))
+            if i % max(1, strokes // 10) == 0:
+                series.append({"strokes": i, "history_bytes": history.nbytes,
+                               "undo_steps": len(history.undo_stack),
+                               "python_heap_bytes": tracemalloc.get_traced_memory()[0]})
+        tracemalloc.stop()
+        bench.add("undo_memory", {"budget_mb": budget_mb, "strokes": strokes}, series=series)
+
+
+# ---------------- Tk (needs a display) ----------------
+def make_app(workdir, entries):
+    """A DiaryApp whose config, entries, images and drawings all live in workdir."""
+    import tkinter as tk
+    import diary
+    root = tk.Tk()
+    root.withdraw()
+    os.makedirs(workdir, exist_ok=True)
+    diary.__file__ = os.path.join(workdir, "diary.py")
+    os.chdir(workdir)
+    write_legacy_diary(os.path.join(workdir, "entries"), entries)
+    app = diary.DiaryApp(root)
+    root.update()
+    return app
+
+
+def close_app(app):
+    app.writer.close()
+    app.search.close()
+    app.storage.close()
+    app.root.destroy()
+
+
+def bench_tk(bench, tk_entries, layer_counts, stroke_points, workdir):
+    import tkinter as tk
+    try:
+        app = make_app(workdir, synthetic_entries(tk_entries))
+    except tk.TclError as e:
+        for name in ("update_calendar", "draw_gradient", "composite_layers", "paint_stroke", "save_data_to_file"):
+            bench.skip(name, str(e).splitlines()[0])
+        return
+    try:
+        months = [app.selected_date.replace(day=1, month=m) for m in range(1, 13)]
+        cycle = iter(months * 1000)
+
+        def switch_month():
+            app.selected_date = next(cycle)
+            app.update_calendar()
+            app.root.update_idletasks()
+
+        bench.time("update_calendar", switch_month, entries=tk_entries)
+
+        frame = app.entry_frame
+        if hasattr(frame, "draw_gradient"):
+            app.root.update_idletasks()
+            bench.time("draw_gradient", frame.draw_gradient, setup=app.gradients._cache.clear, cached=False)
+            bench.time("draw_gradient", frame.draw_gradient, cached=True)
+        else:
+            bench.skip("draw_gradient", f"theme {app.current_theme} has no gradient")
+
+        date_strs = sorted(synthetic_entries(50, seed=2))
+
+        def save_entries():
+            for date_str in date_strs:
+                app.save_data_to_file(date_str, {"text": "benchmark", "color": "green"})
+
+        # Time spent on the Tk thread, then until the background writer has caught up
+        bench.time("save_data_to_file", save_entries, per=len(date_strs), entries=tk_entries, until="returned")
+        bench.time("save_data_to_file", lambda: (save_entries(), app.writer.flush()), per=len(date_strs),
+                   entries=tk_entries, until="written")
+
+        from drawing import DrawingWindow
+        app.current_tool = "brush"
+        window = DrawingWindow(app, app.theme)
+        window.withdraw()
+        window.update()
+        rng = random.Random(11)
+        while len(window.layers) < max(layer_counts):
+            window.add_layer()
+            window.layers[window.active_layer_index]['tiles'] = random_layer(window.doc_size, rng)
+        all_layers = list(window.layers)
+        for count in layer_counts:
+            window.layers[:] = all_layers[:count]
+            window.set_active_layer(0)
+
+            def full():
+                window.invalidate_layer_cache()
+                window.composite_layers()
+
+            bench.time("composite_layers", full, layers=count, region="full")
+            bench.time("composite_layers", lambda: window.composite_layers((100, 100, 164, 164)),
+                       layers=count, region="64x64")
+
+            points = [SimpleNamespace(x=50 + 500 * i // stroke_points, y=200 + int(150 * math.sin(i / 10)))
+                      for i in range(stroke_points)]
+
+            def replay():
+                # Pointer events at ~4x the display rate: the stroke engine rasterizes every 4th event
+                window.on_press(points[0])
+                for i, event in enumerate(points[1:]):
+                    window.on_drag(event)
+                    if i % 4 == 3:
+                        window.stroke_engine.cancel()
+                        window.stroke_engine.flush()
+                window.on_release(points[-1])
+                window.update_idletasks()
+
+            bench.time("paint_stroke", replay, per=stroke_points, layers=count, events=stroke_points)
+        window.destroy()
+    finally:
+        close_app(app)
+
+
+# ---------------- Reporting ----------------
+def metadata():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    try:
+        import PIL
+        pillow = PIL.__version__
+    except ImportError:
+        pillow = None
+    return {"revision": revision, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "pillow": pillow, "platform": platform.platform()}
+
+
+def result_key(result):
+    return result["name"], json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+    print(f"{'benchmark':<60} {'before':>10} {'after':>10} {'ratio':>7}", file=sys.stderr)
+    for result in results:
+        old = baseline.get(result_key(result))
+        if old and "median_ms" in old and "median_ms" in result:
+            ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+            label = f"{result['name']} {result_key(result)[1]}"
+            print(f"{label[:60]:<60} {old['median_ms']:10.3f} {result['median_ms']:10.3f} {ratio:7.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="synthetic diary sizes (entries)")
+    parser.add_argument("--layers", default="1,4,16", help="layer counts for compositing")
+    parser.add_argument("--strokes", type=int, default=500, help="strokes for the undo memory benchmark")
+    parser.add_argument("--stroke-points", type=int, default=300, help="pointer events per replayed stroke")
+    parser.add_argument("--tk-entries", type=int, default=10000, help="diary size behind the Tk benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="comma-separated groups: storage,gradient,layers,fill,undo,tk")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON output to compare medians against")
+    args = parser.parse_args()
+
+    groups = set(args.only.split(",")) if args.only else {"storage", "gradient", "layers", "fill", "undo", "tk"}
+    sizes = [int(s) for s in args.sizes.split(",")]
+    layer_counts = [int(n) for n in args.layers.split(",")]
+    bench = Bench(args.repeat)
+    workdir = tempfile.mkdtemp(prefix="diary-bench-")
+    cwd = os.getcwd()
+    try:
+        if "storage" in groups:
+            bench_storage(bench, sizes, workdir)
+        if "gradient" in groups:
+            bench_gradient(bench)
+        if "layers" in groups:
+            bench_layers(bench, layer_counts)
+        if "fill" in groups:
+            bench_fill(bench)
+        if "undo" in groups:
+            bench_undo_memory(bench, args.strokes)
+        if "tk" in groups:
+            bench_tk(bench, args.tk_entries, layer_counts, args.stroke_points, os.path.join(workdir, "app"))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"meta": metadata(), "results": bench.results, "skipped": bench.skipped}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        compare(bench.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,50 @@
+from profiling import STARTUP, PROFILER
 import tkinter as tk
-from tkinter import colorchooser, filedialog
-from PIL import Image, ImageTk, ImageDraw
 import calendar
 from datetime import datetime
 import json
 import os
 import sys
-import math
+from collections import deque
 from themes import THEMES
 from datetime import timedelta
+from storage import open_storage
+from gradients import GradientRenderer
+from autosave import BackgroundWriter, WriteBehindStorage
+from media import MediaStore, PhotoCache
+from search import SearchIndex
+from stats import MoodStats, MOODS
+from richtext import COLOR_PREFIX, color_tag, encode_format, formatted_pieces, batch_pieces
 
 class DiaryApp:
+    GRADIENT_DEBOUNCE_MS = 40
+    AUTOSAVE_DELAY_MS = 2000
+    LOAD_FIRST_CHARS = 6000  # about a screenful; the rest of a long entry streams in when idle
+    LOAD_BATCH_CHARS = 20000
+
     def __init__(self, root):
+        STARTUP.mark("imports + Tk")
         self.root = root
         self.root.title("♡ My Diary ♡")
         self.root.geometry("900x600")
         
         self.themes = THEMES
+        self.gradients = GradientRenderer(self.root)
         self.config_file = "config.json"
         self.font_main = ("MS PGothic", 12)
         self.load_config()
+        if self.config.get("profiling") or self.config.get("trace_file"):
+            PROFILER.configure(True, PROFILER.trace_path or self.config.get("trace_file"))
 
         self.root.configure(bg=self.theme['main_bg'])
 
         self.selected_date = datetime.now()
-        self.data = {}
+        self.storage = None
+        self.writer = BackgroundWriter(self.root)
+        self.autosave_after = None
+        self.loaded_date = None  # "YYYY-MM-DD" of the entry in the editor; saves go there
+        self.load_after = None
+        self.load_batches = deque()
 
         # Drawing defaults
         self.brush_color = "black"
@@ -36,22 +56,43 @@ class DiaryApp:
         os.makedirs(self.drawings_dir, exist_ok=True)
         self.images_dir = os.path.join(os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__)), "images")
         os.makedirs(self.images_dir, exist_ok=True)
+        self.media = MediaStore(self.images_dir)
+        self.drawing_media = MediaStore(self.drawings_dir)
+        self.photo_cache = PhotoCache()
 
         # Data file setup
         if getattr(sys, 'frozen', False):
-            self.data_file = os.path.join(os.path.dirname(sys.executable), "entries", "diary_data.json")
+            self.entries_dir = os.path.join(os.path.dirname(sys.executable), "entries")
         else:
-            self.data_file = os.path.join(os.path.dirname(__file__), "entries", "diary_data.json")
-
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, "w") as f:
-                json.dump({}, f)
+            self.entries_dir = os.path.join(os.path.dirname(__file__), "entries")
 
         self.load_data()
+        STARTUP.mark("config + storage")
+        self.search = SearchIndex(os.path.join(self.entries_dir, "search_index.jsonl"), self.writer)
+        self.stats = MoodStats(os.path.join(self.entries_dir, "mood_stats.json"), self.writer)
+        self.stats.load(self.storage.items)
+        self.heatmap = None
         self.create_widgets()
         self.update_calendar()
         self.load_entry()
         self.update_time()
+        STARTUP.mark("widgets")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Show the plain-colored window first; gradients (and PIL) come right after
+        self.root.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        self.root.update_idletasks()
+        STARTUP.mark("first frame")
+        self.apply_gradients()
+        self.root.after_idle(self.report_startup)
+
+    def report_startup(self):
+        self.root.update_idletasks()
+        STARTUP.mark("gradients")
+        STARTUP.report(os.path.join(self.entries_dir, "startup_times.jsonl"))
+
+    def apply_gradients(self):
         # Apply backgrounds based on theme
         self.apply_gradient(self.calendar_frame, self.bg_left_start, self.bg_left_end)
         self.apply_gradient(self.entry_frame, self.bg_right_start, self.bg_right_end)
@@ -59,6 +100,32 @@ class DiaryApp:
         self.apply_gradient(self.day_status_frame, self.mood_tracker_bg_start, self.mood_tracker_bg_end)
         self.apply_gradient(self.editor_frame, self.text_editor_buttons_bg_start, self.text_editor_buttons_bg_end)
 
+    def on_close(self):
+        # Write out the last keystrokes and anything still queued before quitting
+        self.flush_autosave()
+        self.writer.close()
+        self.stats.close()
+        self.search.close()
+        self.collect_media_garbage()
+        self.storage.close()
+        PROFILER.close()
+        self.root.destroy()
+
+    def collect_media_garbage(self):
+        stores = {"image_path": self.media, "drawing_export": self.drawing_media}
+        paths = {key: [] for key in stores}
+        if any(store.refs is None or store.released for store in stores.values()):
+            # Only scan the entries when a count has to be rebuilt or a file may be deleted
+            for _, entry in self.storage.items():
+                for key in stores:
+                    if entry.get(key):
+                        paths[key].append(entry[key])
+        for key, store in stores.items():
+            if store.refs is None:
+                # First run with reference counting: count what every entry points at, once
+                store.save_refs(store.rebuild_refs(paths[key]))
+            store.gc(paths[key])
+
     def load_theme(self):
         self.theme = self.themes[self.current_theme]
         self.bg_left_start = self.theme["bg_left_start"]
@@ -91,6 +158,9 @@ class DiaryApp:
     def apply_gradient(self, frame, start_color, end_color):
         # Always unbind first to be safe, and destroy old label if it exists
         frame.unbind("<Configure>")
+        if getattr(frame, 'gradient_after', None):
+            self.root.after_cancel(frame.gradient_after)
+            frame.gradient_after = None
         if hasattr(frame, 'bg_label'):
             try:
                 frame.bg_label.destroy()
@@ -106,46 +176,37 @@ class DiaryApp:
         frame.start_color = start_color
         frame.end_color = end_color
 
+        @PROFILER.timed("draw_gradient")
         def draw_gradient(event=None):
+            frame.gradient_after = None
             width = frame.winfo_width()
             height = frame.winfo_height()
             if width < 2 or height < 2:
                 return
 
-            image = Image.new("RGB", (width, height))
-            draw = ImageDraw.Draw(image)
-
-            # Convert colors to RGB (winfo_rgb returns 0-65535)
-            r1, g1, b1 = self.root.winfo_rgb(frame.start_color)
-            r2, g2, b2 = self.root.winfo_rgb(frame.end_color)
-
-            dr = (r2 - r1) / (height - 1) if height > 1 else 0
-            dg = (g2 - g1) / (height - 1) if height > 1 else 0
-            db = (b2 - b1) / (height - 1) if height > 1 else 0
-
-            r, g, b = r1, g1, b1
-            for i in range(height):
-                draw.line((0, i, width, i), fill=(int(r / 256), int(g / 256), int(b / 256)))
-                r += dr
-                g += dg
-                b += db
-
-            tk_image = ImageTk.PhotoImage(image)
+            tk_image = self.gradients.photo(frame.start_color, frame.end_color, width, height)
 
             if not hasattr(frame, 'bg_label'):
                 frame.bg_label = tk.Label(frame, image=tk_image)
                 frame.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
                 frame.bg_label.lower()  # Send to back so other widgets show on top
+            elif frame.bg_label.image is tk_image:
+                return
             else:
                 frame.bg_label.configure(image=tk_image)
 
             frame.bg_label.image = tk_image  # Keep reference to prevent garbage collection
 
-        frame.draw_gradient = draw_gradient
-        frame.bind("<Configure>", lambda e: draw_gradient())
-        # Initial draw (delay slightly to ensure frame has size)
-        self.root.after(100, draw_gradient)
+        def schedule_gradient(event=None):
+            # Coalesce bursts of <Configure> events into one redraw
+            if frame.gradient_after:
+                self.root.after_cancel(frame.gradient_after)
+            frame.gradient_after = self.root.after(self.GRADIENT_DEBOUNCE_MS, draw_gradient)
 
+        frame.draw_gradient = draw_gradient
+        frame.bind("<Configure>", schedule_gradient)
+        # Initial draw; the window has already been laid out (see finish_startup)
+        frame.gradient_after = self.root.after_idle(draw_gradient)
     # ---------------- UI SETUP ----------------
     def create_widgets(self):
         self.main_frame = tk.Frame(self.root, bg="#C7D3E3")
@@ -177,6 +238,24 @@ class DiaryApp:
 
         self.calendar_grid = tk.Frame(self.calendar_frame, bg=self.bg_left_start)
         self.calendar_grid.pack(pady=10)
+        self.create_calendar_cells()
+
+        # Search
+        self.search_frame = tk.Frame(self.calendar_frame, bg=self.bg_left_start)
+        self.search_frame.pack(pady=5)
+        self.search_var = tk.StringVar()
+        search_entry = tk.Entry(self.search_frame, textvariable=self.search_var, font=self.font_main, width=20)
+        search_entry.pack(side="left", padx=5)
+        search_entry.bind("<Return>", self.run_search)
+        tk.Button(self.search_frame, text="🔍", command=self.run_search,
+                  font=self.font_main, bg=self.button_color,
+                  activebackground=self.active_button).pack(side="left")
+        tk.Button(self.search_frame, text="📊", command=self.open_stats_window,
+                  font=self.font_main, bg=self.button_color,
+                  activebackground=self.active_button).pack(side="left", padx=5)
+        tk.Button(self.search_frame, text="🗓️", command=self.open_heatmap_window,
+                  font=self.font_main, bg=self.button_color,
+                  activebackground=self.active_button).pack(side="left")
 
         # Date and Time Widget
         self.datetime_frame = tk.Frame(self.calendar_frame, bg=self.bg_left_start)
@@ -201,6 +280,8 @@ class DiaryApp:
         self.diary_text = tk.Text(self.text_frame, height=15, width=40, font=self.font_main,
                                   bg=self.text_bg, fg="black", relief="flat", wrap="word", undo=True)
         self.diary_text.pack(fill="both", expand=True)
+        self.diary_text.bind("<KeyPress>", self.finish_loading)
+        self.diary_text.bind("<KeyRelease>", self.schedule_autosave)
 
         # Editor buttons + Save button (same line)
         self.editor_frame = tk.Frame(self.entry_frame, bg=self.bg_right_start)
@@ -276,24 +357,21 @@ class DiaryApp:
         # Apply backgrounds/gradients to all relevant frames.
         # The apply_gradient function will handle whether to draw a gradient
         # or just a solid color based on the current theme.
-        self.apply_gradient(self.calendar_frame, self.bg_left_start, self.bg_left_end)
-        self.apply_gradient(self.entry_frame, self.bg_right_start, self.bg_right_end)
-        self.apply_gradient(self.calendar_grid, self.calendar_bg_start, self.calendar_bg_end)
-        self.apply_gradient(self.day_status_frame, self.mood_tracker_bg_start, self.mood_tracker_bg_end)
-        self.apply_gradient(self.editor_frame, self.text_editor_buttons_bg_start, self.text_editor_buttons_bg_end)
+        self.apply_gradients()
 
     def load_config(self):
         try:
             with open(self.config_file, "r") as f:
-                config = json.load(f)
-                self.current_theme = config.get("theme", "kawaii_pink")
+                self.config = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
-            self.current_theme = "kawaii_pink"
+            self.config = {}
+        self.current_theme = self.config.get("theme", "kawaii_pink")
         self.load_theme()
 
     def save_config(self):
+        self.config["theme"] = self.current_theme
         with open(self.config_file, "w") as f:
-            json.dump({"theme": self.current_theme}, f)
+            json.dump(self.config, f)
 
     def update_ui_colors(self):
         self.root.configure(bg=self.theme['main_bg'])
@@ -369,11 +447,16 @@ class DiaryApp:
         self.diary_text.tag_configure("underline", font=self.font_main + ("underline",))
 
     def change_text_color(self):
+        from tkinter import colorchooser
         color = colorchooser.askcolor()[1]
         if color:
             try:
-                self.diary_text.tag_add(color, "sel.first", "sel.last")
-                self.diary_text.tag_config(color, foreground=color)
+                # One shared tag per color; a new color replaces the old one instead of stacking
+                for tag in self.diary_text.tag_names():
+                    if tag.startswith(COLOR_PREFIX):
+                        self.diary_text.tag_remove(tag, "sel.first", "sel.last")
+                self.diary_text.tag_add(color_tag(self.diary_text, color), "sel.first", "sel.last")
+                self.schedule_autosave()
             except tk.TclError:
                 pass
 
@@ -384,6 +467,7 @@ class DiaryApp:
                 self.diary_text.tag_remove(tag, "sel.first", "sel.last")
             else:
                 self.diary_text.tag_add(tag, "sel.first", "sel.last")
+            self.schedule_autosave()
         except tk.TclError:
             pass
         return "break"
@@ -392,7 +476,7 @@ class DiaryApp:
         emoji_list = ["😊", "😂", "😍", "😢", "😎", "❤️", "👍"]
         menu = tk.Menu(self.root, tearoff=0)
         for e in emoji_list:
-            menu.add_command(label=e, command=lambda em=e: self.diary_text.insert("insert", em))
+            menu.add_command(label=e, command=lambda em=e: (self.finish_loading(), self.diary_text.insert("insert", em)))
         try:
             x = self.root.winfo_pointerx()
             y = self.root.winfo_pointery()
@@ -419,42 +503,86 @@ class DiaryApp:
             return hexcolor
 
     # ---------------- Calendar ----------------
+    def create_calendar_cells(self):
+        # Header labels and a fixed 6x7 pool of day buttons, created once and
+        # only reconfigured afterwards (no destroy/rebuild on navigation)
+        days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+        self.calendar_headers = []
+        for i, day in enumerate(days):
+            label = tk.Label(self.calendar_grid, text=day, font=self.font_main)
+            label.grid(row=0, column=i)
+            self.calendar_headers.append(label)
+        self.calendar_header_state = None
+
+        self.calendar_cells = []
+        for r in range(6):
+            row = []
+            for c in range(7):
+                btn = tk.Button(self.calendar_grid, width=4, height=2)
+                btn.grid(row=r + 1, column=c, padx=2, pady=2)
+                btn.grid_remove()
+                row.append(btn)
+            self.calendar_cells.append(row)
+        # Last applied state per cell; None means the cell is hidden
+        self.calendar_cell_state = [[None] * 7 for _ in range(6)]
+
+    @PROFILER.timed("update_calendar")
     def update_calendar(self):
-        for widget in self.calendar_grid.winfo_children():
-            widget.destroy()
         self.month_year_label.config(text=self.selected_date.strftime("%B %Y"))
         cal = calendar.monthcalendar(self.selected_date.year, self.selected_date.month)
-        days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-        for i, day in enumerate(days):
-            tk.Label(self.calendar_grid, text=day, font=self.font_main, bg=self.bg_left_start, fg=self.text_fg).grid(row=0, column=i)
-        for r, week in enumerate(cal):
-            for c, day in enumerate(week):
-                if day != 0:
-                    date_str = f"{self.selected_date.year}-{self.selected_date.month:02d}-{day:02d}"
-                    color = self.data.get(date_str, {}).get("color") or self.calendar_day_bg
-
-                    # Determine if this day is the currently selected day
-                    is_selected = (day == self.selected_date.day)
+        month_colors = self.storage.month_colors(self.selected_date.year, self.selected_date.month)
 
-                    # If color is a hex color and selected, slightly darken it so the pressed effect is obvious
-                    display_color = color
-                    if is_selected and isinstance(color, str) and color.startswith("#") and len(color) == 7:
-                        display_color = self._darken_hex(color, amount=0.82)
+        header_state = (self.bg_left_start, self.text_fg)
+        if header_state != self.calendar_header_state:
+            for label in self.calendar_headers:
+                label.configure(bg=self.bg_left_start, fg=self.text_fg)
+            self.calendar_header_state = header_state
 
-                    # Visual pressed-in style for selected day
-                    relief_style = "sunken" if is_selected else "raised"
-                    bd_val = 4 if is_selected else 2
-
-                    day_fg_color = self.calendar_day_fg
-                    if self.current_theme in ["dark_mode", "xbox", "galaxy", "windows_95"] and color in ["yellow", "green", "red"]:
-                        day_fg_color = "black"
-
-                    btn = tk.Button(self.calendar_grid, text=str(day), width=4, height=2,
-                                    bg=display_color, command=lambda d=day: self.select_date(d),
-                                    relief=relief_style, bd=bd_val, activebackground=self.active_button, fg=day_fg_color)
-                    btn.grid(row=r + 1, column=c, padx=2, pady=2)
+        for r in range(6):
+            week = cal[r] if r < len(cal) else [0] * 7
+            for c, day in enumerate(week):
+                state = self._calendar_cell_state(day, month_colors) if day != 0 else None
+                previous = self.calendar_cell_state[r][c]
+                if state == previous:
+                    continue
+                btn = self.calendar_cells[r][c]
+                if state is None:
+                    btn.grid_remove()
+                else:
+                    text, bg, relief, bd, fg, active_bg = state
+                    options = {"bg": bg, "relief": relief, "bd": bd, "fg": fg, "activebackground": active_bg}
+                    if previous is None or previous[0] != text:
+                        options["text"] = text
+                        options["command"] = lambda d=day: self.select_date(d)
+                    btn.configure(**options)
+                    if previous is None:
+                        btn.grid()
+                self.calendar_cell_state[r][c] = state
+
+    def _calendar_cell_state(self, day, month_colors):
+        date_str = f"{self.selected_date.year}-{self.selected_date.month:02d}-{day:02d}"
+        color = month_colors.get(date_str) or self.calendar_day_bg
+
+        # Determine if this day is the currently selected day
+        is_selected = (day == self.selected_date.day)
+
+        # If color is a hex color and selected, slightly darken it so the pressed effect is obvious
+        display_color = color
+        if is_selected and isinstance(color, str) and color.startswith("#") and len(color) == 7:
+            display_color = self._darken_hex(color, amount=0.82)
+
+        # Visual pressed-in style for selected day
+        relief_style = "sunken" if is_selected else "raised"
+        bd_val = 4 if is_selected else 2
+
+        day_fg_color = self.calendar_day_fg
+        if self.current_theme in ["dark_mode", "xbox", "galaxy", "windows_95"] and color in ["yellow", "green", "red"]:
+            day_fg_color = "black"
+
+        return (str(day), display_color, relief_style, bd_val, day_fg_color, self.active_button)
 
     def next_month(self):
+        self.flush_autosave()
         if self.selected_date.month == 12:
             self.selected_date = self.selected_date.replace(year=self.selected_date.year + 1, month=1)
         else:
@@ -462,6 +590,7 @@ class DiaryApp:
         self.update_calendar()
 
     def prev_month(self):
+        self.flush_autosave()
         if self.selected_date.month == 1:
             self.selected_date = self.selected_date.replace(year=self.selected_date.year - 1, month=12)
         else:
@@ -469,486 +598,298 @@ class DiaryApp:
         self.update_calendar()
 
     def select_date(self, day):
+        self.flush_autosave()
         self.selected_date = self.selected_date.replace(day=day)
         self.update_calendar()
         self.load_entry()
 
+    # ---------------- Search ----------------
+    def run_search(self, event=None):
+        query = self.search_var.get().strip()
+        if not query:
+            return
+        self.flush_autosave()
+        self.search.load(self.storage.items)
+        dates = self.search.search(query)
+
+        win = tk.Toplevel(self.root)
+        win.title("🔍 Search")
+        win.geometry("400x300")
+        win.configure(bg=self.theme['bg_left_start'])
+        tk.Label(win, text=f"{len(dates)} entries for \"{query}\"", font=self.font_main,
+                 bg=self.theme['bg_left_start']).pack(pady=5)
+        results = tk.Listbox(win, font=self.font_main)
+        results.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        for date_str in dates:
+            snippet = " ".join(self.storage.get(date_str).get("text", "").split())[:40]
+            results.insert("end", f"{date_str}  {snippet}")
+
+        def open_result(event=None):
+            selection = results.curselection()
+            if not selection:
+                return
+            self.flush_autosave()
+            self.selected_date = datetime.strptime(dates[selection[0]], "%Y-%m-%d")
+            self.update_calendar()
+            self.load_entry()
+
+        results.bind("<Double-Button-1>", open_result)
+        results.bind("<Return>", open_result)
+
+    # ---------------- Mood Statistics ----------------
+    def open_stats_window(self):
+        win = tk.Toplevel(self.root)
+        win.title("📊 Mood Statistics")
+        win.geometry("420x420")
+        win.configure(bg=self.theme['bg_left_start'])
+        names = {"any": "Any mood", "green": "Healthy eating + exercise",
+                 "yellow": "Healthy eating", "red": "Bad Day"}
+
+        def fmt_avg(value):
+            return "–" if value is None else f"{value:.2f}"
+
+        lines = ["Streaks (current / longest)"]
+        for kind, (current, longest) in self.stats.streaks().items():
+            lines.append(f"  {names[kind]}: {current} / {longest} days")
+        lines.append("")
+        lines.append(f"Average mood, last 7 days: {fmt_avg(self.stats.rolling_average(7))}")
+        lines.append(f"Average mood, last 30 days: {fmt_avg(self.stats.rolling_average(30))}")
+        lines.append(f"Average mood, last 365 days: {fmt_avg(self.stats.rolling_average(365))}")
+        lines.append("  (Bad Day 0, Healthy eating 1, + exercise 2)")
+        for year in self.stats.year_list():
+            counts = self.stats.year_counts(year)
+            lines.append("")
+            lines.append(f"{year}  " + "  ".join(f"{m}: {counts.get(m, 0)}" for m in MOODS)
+                         + f"  avg {fmt_avg(self.stats.average(counts))}")
+            for month in range(1, 13):
+                counts = self.stats.month_counts(int(year), month)
+                if counts:
+                    lines.append(f"  {calendar.month_abbr[month]}  " + "  ".join(f"{m}: {counts.get(m, 0)}" for m in MOODS)
+                                 + f"  avg {fmt_avg(self.stats.average(counts))}")
+
+        text = tk.Text(win, font=self.font_main, bg=self.text_bg, relief="flat", wrap="none")
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+        text.insert("1.0", "\n".join(lines))
+        text.configure(state="disabled")
+
+    def open_heatmap_window(self):
+        from PIL import ImageTk
+        from heatmap import Heatmap
+        if self.heatmap is None:
+            self.heatmap = Heatmap()
+        win = tk.Toplevel(self.root)
+        win.title("🗓️ Mood Heatmap")
+        win.geometry("780x500")
+        win.configure(bg=self.theme['bg_left_start'])
+
+        span_var = tk.IntVar(value=1)
+        controls = tk.Frame(win, bg=self.theme['bg_left_start'])
+        controls.pack(pady=5)
+        tk.Label(controls, text="Years:", font=self.font_main, bg=self.theme['bg_left_start']).pack(side="left")
+        tk.OptionMenu(controls, span_var, 1, 3, 5, 10, command=lambda _: draw()).pack(side="left", padx=5)
+
+        frame = tk.Frame(win)
+        frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        canvas = tk.Canvas(frame, bg=self.theme['bg_left_start'], highlightthickness=0)
+        scrollbar = tk.Scrollbar(frame, orient="vertical", command=canvas.yview)
+        canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        canvas.pack(side="left", fill="both", expand=True)
+        image_item = canvas.create_image(0, 0, anchor="nw")
+        colors = {mood: self.gradients.rgb(mood) for mood in MOODS}
+        colors.update(empty=self.gradients.rgb(self.calendar_day_bg),
+                      bg=self.gradients.rgb(self.theme['bg_left_start']),
+                      fg=self.gradients.rgb(self.calendar_day_fg))
+
+        def years():
+            last = max([datetime.now().year] + [int(y) for y in self.stats.year_list()])
+            return list(range(last, last - span_var.get(), -1))
+
+        def draw():
+            image = self.heatmap.render(years(), self.stats.days, self.stats.version, colors)
+            canvas.image = ImageTk.PhotoImage(image)
+            canvas.itemconfigure(image_item, image=canvas.image)
+            canvas.configure(scrollregion=(0, 0) + image.size)
+
+        def on_click(event):
+            day = self.heatmap.hit_test(years(), canvas.canvasx(event.x), canvas.canvasy(event.y))
+            if day is None:
+                return
+            self.flush_autosave()
+            self.selected_date = datetime(day.year, day.month, day.day)
+            self.update_calendar()
+            self.load_entry()
+
+        canvas.bind("<Button-1>", on_click)
+        draw()
+
     # ---------------- Save / Load ----------------
+    def editor_contents(self):
+        """The editor's text and its run-length encoded formatting (None if unformatted)."""
+        self.finish_loading()
+        return self.diary_text.get("1.0", "end-1c"), encode_format(self.diary_text)
+
+    def set_entry_text(self, entry, entry_text, fmt):
+        entry["text"] = entry_text
+        if fmt:
+            entry["format"] = fmt
+        else:
+            entry.pop("format", None)
+
     def save_entry(self):
-        date_str = self.selected_date.strftime("%Y-%m-%d")
-        entry_text = self.diary_text.get("1.0", "end-1c")
+        date_str = self.loaded_date
+        entry_text, fmt = self.editor_contents()
         status = self.status_var.get()
-        if date_str not in self.data:
-            self.data[date_str] = {}
-        self.data[date_str]["text"] = entry_text
-        self.data[date_str]["color"] = status
-        self.save_data_to_file()
+        entry = self.storage.get(date_str)
+        self.set_entry_text(entry, entry_text, fmt)
+        entry["color"] = status
+        self.search.update(date_str, entry_text)
+        self.save_data_to_file(date_str, entry)
         self.update_calendar()
 
+    def schedule_autosave(self, event=None):
+        # Debounce typing: save once the keyboard has been idle for a moment
+        if self.autosave_after:
+            self.root.after_cancel(self.autosave_after)
+        self.autosave_after = self.root.after(self.AUTOSAVE_DELAY_MS, self.autosave)
+
+    def flush_autosave(self):
+        if self.autosave_after:
+            self.root.after_cancel(self.autosave_after)
+            self.autosave()
+
+    def autosave(self):
+        self.autosave_after = None
+        date_str = self.loaded_date
+        entry = self.storage.get(date_str)
+        entry_text, fmt = self.editor_contents()
+        if entry.get("text", "") == entry_text and entry.get("format") == fmt:
+            return
+        self.set_entry_text(entry, entry_text, fmt)
+        entry["color"] = self.status_var.get()
+        self.search.update(date_str, entry_text)
+        self.save_data_to_file(date_str, entry)
+
     def load_entry(self):
         date_str = self.selected_date.strftime("%Y-%m-%d")
-        entry = self.data.get(date_str, {})
+        entry = self.storage.get(date_str)
+        self.loaded_date = date_str
+        self.cancel_loading()
         self.diary_text.delete("1.0", "end")
-        self.diary_text.insert("1.0", entry.get("text", ""))
+        pieces = formatted_pieces(self.diary_text, entry.get("text", ""), entry.get("format"))
+        self.load_batches.extend(batch_pieces(pieces, self.LOAD_FIRST_CHARS, self.LOAD_BATCH_CHARS))
+        if self.load_batches:
+            self.diary_text.insert("end", *self.load_batches.popleft())
         self.status_var.set(entry.get("color", ""))
+        if self.load_batches:
+            self.load_after = self.root.after_idle(self.load_next_batch)
+        else:
+            self.diary_text.edit_reset()
+
+    def load_next_batch(self):
+        self.load_after = None
+        self.diary_text.insert("end", *self.load_batches.popleft())
+        if self.load_batches:
+            self.load_after = self.root.after_idle(self.load_next_batch)
+        else:
+            self.diary_text.edit_reset()  # loading isn't an undoable edit
+
+    def finish_loading(self, event=None):
+        # Before the text is read or edited, insert whatever is still streaming in
+        if self.load_after:
+            self.root.after_cancel(self.load_after)
+            self.load_after = None
+            while self.load_batches:
+                self.diary_text.insert("end", *self.load_batches.popleft())
+            self.diary_text.edit_reset()
+
+    def cancel_loading(self):
+        if self.load_after:
+            self.root.after_cancel(self.load_after)
+            self.load_after = None
+        self.load_batches.clear()
 
     def load_data(self):
-        try:
-            with open(self.data_file, "r") as f:
-                self.data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            self.data = {}
+        # "journal" (default) appends one record per save, "json" is the old whole-file format.
+        # Writes go through the background writer so saving never blocks the UI.
+        storage = open_storage(self.config.get("storage", "journal"), self.entries_dir)
+        self.storage = WriteBehindStorage(storage, self.writer)
 
-    def save_data_to_file(self):
-        with open(self.data_file, "w") as f:
-            json.dump(self.data, f, indent=4)
+    @PROFILER.timed("save_data_to_file")
+    def save_data_to_file(self, date_str, entry):
+        # Derived data first, so its dirty marker is down before the entry write is queued
+        self.stats.record(date_str, entry.get("color"))
+        self.storage.put(date_str, entry)
 
     # ---------------- Image of the Day ----------------
     def open_image_window(self):
+        from tkinter import filedialog
+        from PIL import ImageTk
         win = tk.Toplevel(self.root)
         win.title("🖼️ Image of the Day")
         win.geometry("400x400")
         win.configure(bg=self.theme['bg_right_start'])
 
         date_str = self.selected_date.strftime("%Y-%m-%d")
-        current = self.data.get(date_str, {}).get("image_path")
+        current = self.storage.get(date_str).get("image_path")
 
-        img_label = tk.Label(win, bg=self.theme['bg_right_start'])
+        img_label = tk.Label(win, bg=self.theme['bg_right_start'], font=self.font_main)
         img_label.pack(pady=10)
 
+        def show_thumbnail(path, thumb):
+            tk_img = ImageTk.PhotoImage(thumb)
+            self.photo_cache.put(path, tk_img)
+            if img_label.winfo_exists():
+                img_label.configure(image=tk_img, text="")
+                img_label.image = tk_img
+
         def load_image():
             path = filedialog.askopenfilename(
                 filetypes=[("Image Files", "*.png *.jpg *.jpeg *.gif")]
             )
             if path:
-                filename = os.path.basename(path)
-                new_path = os.path.join(self.images_dir, filename)
-                img = Image.open(path)
-                img.save(new_path)
+                def image_stored(new_path):
+                    # Record the upload first, so a thumbnail that fails to decode can't lose it
+                    self.set_entry_media(date_str, "image_path", self.media, new_path)
+                    if img_label.winfo_exists():
+                        img_label.configure(text="Loading…")
+                    self.writer.run(lambda: self.media.load_thumbnail(new_path),
+                                    lambda thumb: show_thumbnail(new_path, thumb))
 
-                img.thumbnail((300, 300))
-                tk_img = ImageTk.PhotoImage(img)
-                img_label.configure(image=tk_img)
-                img_label.image = tk_img
-                if date_str not in self.data:
-                    self.data[date_str] = {}
-                self.data[date_str]["image_path"] = new_path
-                self.save_data_to_file()
+                # Byte copy into the media store on the writer thread
+                self.writer.submit(("image", path), lambda: self.media.add_file(path), image_stored)
 
         tk.Button(win, text="Upload Image", command=load_image,
                   bg=self.theme['button_color'], activebackground=self.theme['active_button'],
                   font=self.font_main).pack(pady=5)
 
         if current and os.path.exists(current):
-            img = Image.open(current)
-            img.thumbnail((300, 300))
-            tk_img = ImageTk.PhotoImage(img)
-            img_label.configure(image=tk_img)
-            img_label.image = tk_img
+            tk_img = self.photo_cache.get(current)
+            if tk_img is not None:
+                img_label.configure(image=tk_img)
+                img_label.image = tk_img
+            else:
+                img_label.configure(text="Loading…")
+                self.writer.run(lambda: self.media.load_thumbnail(current),
+                                lambda thumb: show_thumbnail(current, thumb))
+
+    def set_entry_media(self, date_str, key, store, new_path, **extra):
+        """Point an entry's media field at a stored file and keep the store's reference counts in step."""
+        entry = self.storage.get(date_str)
+        old_path = entry.get(key)
+        refs_json = store.retarget(old_path, new_path)
+        if refs_json is not None:
+            # Queued ahead of the entry: a crash in between leaves an extra count, never a missing one
+            self.writer.submit(("refs", store.root_dir), lambda: store.save_refs(refs_json))
+        entry[key] = new_path
+        entry.update(extra)
+        self.save_data_to_file(date_str, entry)
 
     # ---------------- Drawing of the Day ----------------
     def open_drawing_window(self):
+        from drawing import DrawingWindow
         DrawingWindow(self, self.theme)
 
-class DrawingWindow(tk.Toplevel):
-    def __init__(self, app, theme):
-        super().__init__(app.root)
-        self.app = app
-        self.theme = theme
-        self.title("🎨 Drawing of the Day")
-        self.geometry("850x650")  # Adjusted height to accommodate controls
-        self.resizable(False, False)
-        self.configure(bg=self.theme['bg_right_start'])
-
-        self.date_str = self.app.selected_date.strftime("%Y-%m-%d")
-        self.draw_path = os.path.join(self.app.drawings_dir, f"drawing_{self.date_str}.png")
-
-        # Main frame for canvas and layers
-        main_drawing_frame = tk.Frame(self, bg=self.theme['bg_right_start'])
-        main_drawing_frame.pack(fill="both", expand=True)
-
-        self.canvas_width, self.canvas_height = 600, 400
-        self.canvas = tk.Canvas(main_drawing_frame, width=self.canvas_width, height=self.canvas_height, bg="white")
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.canvas.bind("<Configure>", self.on_canvas_configure)
-
-        # Layer management UI
-        layer_frame = tk.Frame(main_drawing_frame, bg=self.theme['bg_right_start'], bd=2, relief="sunken")
-        layer_frame.pack(side="right", fill="y", padx=(10, 0))
-        tk.Label(layer_frame, text="Layers", font=self.app.font_main, bg=self.theme['bg_right_start'], fg=self.theme['text_fg']).pack(pady=5)
-        self.layer_listbox = tk.Listbox(layer_frame, selectmode="browse", font=self.app.font_main, bg=self.theme['text_bg'], fg=self.theme['text_fg'])
-        self.layer_listbox.pack(pady=5, padx=5, fill="y", expand=True)
-        self.layer_listbox.bind("<<ListboxSelect>>", self.on_layer_select)
-
-        layer_button_frame = tk.Frame(layer_frame, bg=self.theme['bg_right_start'])
-        layer_button_frame.pack(pady=5)
-        tk.Button(layer_button_frame, text="+", command=self.add_layer, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
-        tk.Button(layer_button_frame, text="-", command=self.remove_layer, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
-        tk.Button(layer_button_frame, text="↑", command=self.move_layer_up, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
-        tk.Button(layer_button_frame, text="↓", command=self.move_layer_down, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
-
-        self.layers = []
-        self.active_layer_index = 0
-        self.undo_stack = []
-        self.redo_stack = []
-
-        if os.path.exists(self.draw_path):
-            self.load_drawing()
-        else:
-            self.add_layer("Background")
-
-        self.update_layer_listbox()
-        self.composite_layers()
-
-        self.start_x, self.start_y = None, None
-        self.preview_shape = None
-        self.preview_circle = self.canvas.create_oval(0, 0, 0, 0, outline="black", width=1)
-
-        self.canvas.bind("<ButtonPress-1>", self.on_press)
-        self.canvas.bind("<B1-Motion>", self.on_drag)
-        self.canvas.bind("<ButtonRelease-1>", self.on_release)
-        self.canvas.bind("<Motion>", self.update_preview)
-
-        # Tools frame
-        tools_frame = tk.Frame(self, bg=self.theme['bg_right_start'])
-        tools_frame.pack(pady=5)
-
-        self.tool_buttons = {}
-        for tool_name in ["Brush", "Eraser", "Fill"]:
-            btn = tk.Button(tools_frame, text=tool_name,
-                            command=lambda t=tool_name.lower(): self.select_tool(t),
-                            bg=self.theme['button_color'], activebackground=self.theme['active_button'])
-            btn.pack(side="left", padx=5)
-            self.tool_buttons[tool_name.lower()] = btn
-
-        self.shape_var = tk.StringVar(value="Line")
-        self.shape_options = ["Line", "Rectangle", "Oval", "Star", "Heart"]
-        shape_menu = tk.OptionMenu(tools_frame, self.shape_var, *self.shape_options, command=self.select_shape_tool)
-        shape_menu.pack(side="left", padx=5)
-        self.tool_buttons["shape"] = shape_menu
-
-        self.color_btn = tk.Button(tools_frame, text="Color", bg=self.app.brush_color, command=self.choose_color)
-        self.color_btn.pack(side="left", padx=5)
-
-        # Size and opacity frame
-        self.size_frame = tk.Frame(self, bg=self.theme['bg_right_start'])
-        self.size_frame.pack(pady=5)
-        self.opacity_var = tk.IntVar(value=255)
-        tk.Label(self.size_frame, text="Opacity", bg=self.theme['bg_right_start'], fg=self.theme['text_fg']).pack(side="left")
-        tk.Scale(self.size_frame, from_=0, to=255, orient="horizontal", variable=self.opacity_var,
-                 bg=self.theme['bg_right_start'], fg=self.theme['text_fg'], troughcolor=self.theme['button_color']).pack(side="left", padx=5)
-        self.scale_var = tk.IntVar()
-        self.update_size_frame()
-        self.select_tool("brush")  # Select brush by default
-
-        # Bottom actions
-        action_frame = tk.Frame(self, bg=self.theme['bg_right_start'])
-        action_frame.pack(pady=5)
-        tk.Button(action_frame, text="Undo", command=self.undo_action, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=5)
-        tk.Button(action_frame, text="Redo", command=self.redo_action, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=5)
-        tk.Button(action_frame, text="Clear", command=self.clear_action, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=5)
-        tk.Button(action_frame, text="💾 Save", command=self.save_drawing, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=5)
-
-    def on_canvas_configure(self, event):
-        new_width = event.width
-        new_height = event.height
-        if new_width != self.canvas_width or new_height != self.canvas_height:
-            self.canvas_width = new_width
-            self.canvas_height = new_height
-            self.resize_layers()
-
-    def resize_layers(self):
-        for layer in self.layers:
-            layer['image'] = layer['image'].resize((self.canvas_width, self.canvas_height), Image.Resampling.LANCZOS)
-        self.composite_layers()
-
-    def on_press(self, event):
-        self._save_state_for_undo()
-        self.start_x, self.start_y = event.x, event.y
-        if self.app.current_tool == "fill":
-            self.fill(self.start_x, self.start_y)
-        elif self.app.current_tool in ["line", "rectangle", "oval", "star", "heart"]:
-            color = self.app.brush_color
-            self.preview_shape = self.canvas.create_line(
-                self.start_x, self.start_y, self.start_x, self.start_y, fill=color, width=int(self.app.brush_width)
-            ) if self.app.current_tool == "line" else \
-                self.canvas.create_rectangle(
-                    self.start_x, self.start_y, self.start_x, self.start_y, outline=color, width=int(self.app.brush_width)
-                ) if self.app.current_tool == "rectangle" else \
-                self.canvas.create_oval(
-                    self.start_x, self.start_y, self.start_x, self.start_y, outline=color, width=int(self.app.brush_width)
-                ) if self.app.current_tool == "oval" else \
-                self.draw_preview_shape(self.start_x, self.start_y, self.start_x, self.start_y)
-
-    def on_drag(self, event):
-        if self.app.current_tool == "brush" or self.app.current_tool == "eraser":
-            self.paint(event)
-        elif self.app.current_tool in ["line", "rectangle", "oval"] and self.preview_shape:
-            self.canvas.coords(self.preview_shape, self.start_x, self.start_y, event.x, event.y)
-        elif self.app.current_tool in ["star", "heart"] and self.preview_shape:
-            self.canvas.delete(self.preview_shape)
-            self.preview_shape = self.draw_preview_shape(self.start_x, self.start_y, event.x, event.y)
-
-    def on_release(self, event):
-        if self.app.current_tool in ["line", "rectangle", "oval", "star", "heart"]:
-            self.draw_shape(self.start_x, self.start_y, event.x, event.y)
-            if self.preview_shape:
-                self.canvas.delete(self.preview_shape)
-                self.preview_shape = None
-        self.start_x, self.start_y = None, None
-        self.composite_layers()
-
-    def get_brush_color(self):
-        color = self.app.brush_color
-        if isinstance(color, str) and color.startswith('#'):
-            r = int(color[1:3], 16)
-            g = int(color[3:5], 16)
-            b = int(color[5:7], 16)
-            return (r, g, b, int(self.opacity_var.get()))
-        return (0, 0, 0, int(self.opacity_var.get()))
-
-    def paint(self, event):
-        x, y = event.x, event.y
-        active_layer_image = self.layers[self.active_layer_index]['image']
-        draw = ImageDraw.Draw(active_layer_image)
-        color = self.get_brush_color() if self.app.current_tool == "brush" else (0, 0, 0, 0)
-        width = self.app.brush_width if self.app.current_tool == "brush" else self.app.eraser_width
-        if self.start_x is not None and self.start_y is not None:
-            draw.line((self.start_x, self.start_y, x, y), fill=color, width=int(width))
-        self.start_x, self.start_y = x, y
-        self.update_preview(event)
-        self.composite_layers()
-
-    def fill(self, x, y):
-        if self.layers:
-            active_layer_image = self.layers[self.active_layer_index]['image']
-            color_to_fill = self.get_brush_color()
-            ImageDraw.floodfill(active_layer_image, (x, y), color_to_fill)
-            self.composite_layers()
-
-    def draw_shape(self, x1, y1, x2, y2):
-        if self.layers:
-            active_layer_image = self.layers[self.active_layer_index]['image']
-            draw = ImageDraw.Draw(active_layer_image)
-            color = self.get_brush_color()
-            width = self.app.brush_width
-            if self.app.current_tool == "line":
-                draw.line((x1, y1, x2, y2), fill=color, width=int(width))
-            elif self.app.current_tool == "rectangle":
-                draw.rectangle((x1, y1, x2, y2), outline=color, width=int(width))
-            elif self.app.current_tool == "oval":
-                draw.ellipse((x1, y1, x2, y2), outline=color, width=int(width))
-            elif self.app.current_tool == "star":
-                self.draw_star(draw, x1, y1, x2, y2, color, int(width))
-            elif self.app.current_tool == "heart":
-                self.draw_heart(draw, x1, y1, x2, y2, color, int(width))
-
-    def draw_preview_shape(self, x1, y1, x2, y2):
-        color = self.app.brush_color
-        width = int(self.app.brush_width)
-        if self.app.current_tool == "star":
-            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
-            outer_radius = min(abs(x2 - x1), abs(y2 - y1)) / 2
-            inner_radius = outer_radius / 2.5
-            points = []
-            for i in range(10):
-                angle_deg = -90 + i * 36
-                angle_rad = math.radians(angle_deg)
-                radius = outer_radius if i % 2 == 0 else inner_radius
-                points.append((cx + radius * math.cos(angle_rad), cy + radius * math.sin(angle_rad)))
-            return self.canvas.create_polygon(points, fill="", outline=color, width=width)
-        elif self.app.current_tool == "heart":
-            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
-            width_h = abs(x2 - x1)
-            height_h = abs(y2 - y1)
-            points = []
-            for i in range(0, 100):
-                t = 2 * math.pi * i / 100
-                x = cx + width_h/20 * (16 * math.sin(t)**3)
-                y = cy - height_h/20 * (13 * math.cos(t) - 5 * math.cos(2*t) - 2 * math.cos(3*t) - math.cos(4*t))
-                points.append((x, y))
-            return self.canvas.create_line(points, fill=color, width=width, joinstyle="round")
-
-    def draw_star(self, draw, x1, y1, x2, y2, color, width):
-        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
-        outer_radius = min(abs(x2 - x1), abs(y2 - y1)) / 2
-        inner_radius = outer_radius / 2.5
-        points = []
-        for i in range(10):
-            angle_deg = -90 + i * 36
-            angle_rad = math.radians(angle_deg)
-            radius = outer_radius if i % 2 == 0 else inner_radius
-            points.append((cx + radius * math.cos(angle_rad), cy + radius * math.sin(angle_rad)))
-        draw.polygon(points, outline=color, width=width)
-
-    def draw_heart(self, draw, x1, y1, x2, y2, color, width):
-        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
-        width_h = abs(x2 - x1)
-        height_h = abs(y2 - y1)
-        points = []
-        for i in range(0, 100):
-            t = 2 * math.pi * i / 100
-            x = cx + width_h/20 * (16 * math.sin(t)**3)
-            y = cy - height_h/20 * (13 * math.cos(t) - 5 * math.cos(2*t) - 2 * math.cos(3*t) - math.cos(4*t))
-            points.append((x, y))
-        draw.line(points, fill=color, width=width, joint="curve")
-
-    def update_preview(self, event=None):
-        if event:
-            x, y = event.x, event.y
-        else:
-            x = self.canvas.winfo_pointerx() - self.canvas.winfo_rootx()
-            y = self.canvas.winfo_pointery() - self.canvas.winfo_rooty()
-        if self.app.current_tool == "brush" or self.app.current_tool == "eraser":
-            width = self.app.brush_width if self.app.current_tool == "brush" else self.app.eraser_width
-            radius = width / 2
-            color = self.app.brush_color if self.app.current_tool == "brush" else "gray"
-            self.canvas.coords(self.preview_circle, x - radius, y - radius, x + radius, y + radius)
-            self.canvas.itemconfig(self.preview_circle, outline=color)
-            self.canvas.tag_raise(self.preview_circle)
-        else:
-            self.canvas.coords(self.preview_circle, -10, -10, -10, -10)
-
-    def select_tool(self, tool):
-        self.app.current_tool = tool
-        for t, btn in self.tool_buttons.items():
-            if t != "shape":
-                btn.config(bg=self.theme['active_button'] if t == tool else self.theme['button_color'])
-        self.update_size_frame()
-
-    def select_shape_tool(self, shape):
-        self.select_tool(shape.lower())
-
-    def update_size_frame(self):
-        for widget in self.size_frame.winfo_children():
-            widget.destroy()
-        tk.Label(self.size_frame, text="Opacity", bg=self.theme['bg_right_start'], fg=self.theme['text_fg']).pack(side="left")
-        tk.Scale(self.size_frame, from_=0, to=255, orient="horizontal", variable=self.opacity_var,
-                 bg=self.theme['bg_right_start'], fg=self.theme['text_fg'], troughcolor=self.theme['button_color']).pack(side="left", padx=5)
-        if self.app.current_tool in ["brush", "eraser", "line", "rectangle", "oval", "star", "heart"]:
-            preset_sizes = [1, 5, 10, 20]
-            for s in preset_sizes:
-                tk.Button(self.size_frame, text=str(s),
-                          command=lambda val=s: self.set_size(val, update_slider=True),
-                          bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
-            current_width = self.app.brush_width if self.app.current_tool in ["brush", "line", "rectangle", "oval", "star", "heart"] else self.app.eraser_width
-            self.scale_var.set(int(current_width))
-            scale = tk.Scale(self.size_frame, from_=1, to=50, orient="horizontal", resolution=1,
-                             variable=self.scale_var,
-                             command=lambda val: self.set_size(int(val), update_slider=False),
-                             bg=self.theme['bg_right_start'], fg=self.theme['text_fg'], troughcolor=self.theme['button_color'])
-            scale.pack(side="left", padx=5)
-
-    def set_size(self, val, update_slider=True):
-        if self.app.current_tool in ["brush", "line", "rectangle", "oval", "star", "heart"]:
-            self.app.brush_width = int(val)
-        elif self.app.current_tool == "eraser":
-            self.app.eraser_width = int(val)
-        if update_slider:
-            self.scale_var.set(int(val))
-
-    def choose_color(self):
-        color = colorchooser.askcolor(color=self.app.brush_color, parent=self)[1]
-        if color:
-            self.app.brush_color = color
-            self.color_btn.config(bg=color)
-
-    def _save_state_for_undo(self):
-        if self.layers:
-            active_layer_image = self.layers[self.active_layer_index]['image']
-            self.undo_stack.append(active_layer_image.copy())
-            self.redo_stack.clear()
-
-    def undo_action(self):
-        if self.undo_stack:
-            current_image = self.layers[self.active_layer_index]['image']
-            self.redo_stack.append(current_image)
-            self.layers[self.active_layer_index]['image'] = self.undo_stack.pop()
-            self.composite_layers()
-
-    def redo_action(self):
-        if self.redo_stack:
-            current_image = self.layers[self.active_layer_index]['image']
-            self.undo_stack.append(current_image)
-            self.layers[self.active_layer_index]['image'] = self.redo_stack.pop()
-            self.composite_layers()
-
-    def clear_action(self):
-        if self.layers:
-            active_layer_image = self.layers[self.active_layer_index]['image']
-            draw = ImageDraw.Draw(active_layer_image)
-            draw.rectangle([0, 0, self.canvas_width, self.canvas_height], fill=(0, 0, 0, 0))
-            self.composite_layers()
-
-    def save_drawing(self):
-        final_image = Image.new("RGBA", (self.canvas_width, self.canvas_height), (255, 255, 255, 255))
-        for layer in reversed(self.layers):
-            final_image.alpha_composite(layer['image'])
-        final_image.convert("RGB").save(self.draw_path)
-
-    def load_drawing(self):
-        try:
-            loaded_image = Image.open(self.draw_path).convert("RGBA")
-            self.add_layer("Loaded Drawing", image=loaded_image)
-        except FileNotFoundError:
-            self.add_layer("Background")
-
-    def add_layer(self, name=None, image=None):
-        if name is None:
-            name = f"Layer {len(self.layers) + 1}"
-        if image is None:
-            image = Image.new("RGBA", (self.canvas_width, self.canvas_height), (0, 0, 0, 0))
-        insert_index = self.active_layer_index
-        self.layers.insert(insert_index, {'name': name, 'image': image})
-        self.active_layer_index = insert_index
-        self.update_layer_listbox()
-        self.composite_layers()
-
-    def remove_layer(self):
-        if len(self.layers) > 0 and self.active_layer_index is not None:
-            self.layers.pop(self.active_layer_index)
-            if self.active_layer_index >= len(self.layers):
-                self.active_layer_index = len(self.layers) - 1
-            if not self.layers:
-                self.add_layer("Background")
-            self.update_layer_listbox()
-            self.composite_layers()
-
-    def move_layer_up(self):
-        if self.active_layer_index > 0:
-            self.layers.insert(self.active_layer_index - 1, self.layers.pop(self.active_layer_index))
-            self.active_layer_index -= 1
-            self.update_layer_listbox()
-            self.composite_layers()
-
-    def move_layer_down(self):
-        if self.active_layer_index < len(self.layers) - 1:
-            self.layers.insert(self.active_layer_index + 1, self.layers.pop(self.active_layer_index))
-            self.active_layer_index += 1
-            self.update_layer_listbox()
-            self.composite_layers()
-
-    def on_layer_select(self, event):
-        if self.layer_listbox.curselection():
-            self.active_layer_index = self.layer_listbox.curselection()[0]
-
-    def update_layer_listbox(self):
-        self.layer_listbox.delete(0, "end")
-        for i, layer in enumerate(self.layers):
-            self.layer_listbox.insert("end", layer['name'])
-            if i == self.active_layer_index:
-                self.layer_listbox.selection_set(i)
-                self.layer_listbox.activate(i)
-
-    def composite_layers(self):
-        composite_image = Image.new("RGBA", (self.canvas_width, self.canvas_height), (255, 255, 255, 255))
-        for layer in reversed(self.layers):
-            composite_image.alpha_composite(layer['image'])
-        self.tk_img = ImageTk.PhotoImage(composite_image)
-        self.canvas.delete("all")
-        self.canvas.create_image(0, 0, image=self.tk_img, anchor="nw")
-        self.preview_circle = self.canvas.create_oval(0, 0, 0, 0, outline="black", width=1)
-
 if __name__ == "__main__":
     root = tk.Tk()
     app = DiaryApp(root)
@@ -0,0 +1,639 @@
+import tkinter as tk
+from tkinter import colorchooser
+from PIL import Image, ImageTk, ImageDraw
+import os
+import math
+from layers import TiledLayer, save_document, load_document
+from history import History, StrokeOp, AddLayerOp, RemoveLayerOp, MoveLayerOp
+from profiling import PROFILER
+from strokes import StrokeEngine
+from fill import flood_fill_mask
+from shapes import SHAPES
+
+BOX_TOOLS = ["line", "rectangle", "oval"]
+SHAPE_TOOLS = BOX_TOOLS + list(SHAPES)
+
+
+class DrawingWindow(tk.Toplevel):
+    def __init__(self, app, theme):
+        super().__init__(app.root)
+        self.app = app
+        self.theme = theme
+        self.title("🎨 Drawing of the Day")
+        self.geometry("850x650")  # Adjusted height to accommodate controls
+        self.resizable(False, False)
+        self.configure(bg=self.theme['bg_right_start'])
+
+        self.date_str = self.app.selected_date.strftime("%Y-%m-%d")
+        self.draw_path = os.path.join(self.app.drawings_dir, f"drawing_{self.date_str}.png")  # pre-layers drawings
+        self.layers_path = os.path.join(self.app.drawings_dir, f"drawing_{self.date_str}.layers")
+
+        # Main frame for canvas and layers
+        main_drawing_frame = tk.Frame(self, bg=self.theme['bg_right_start'])
+        main_drawing_frame.pack(fill="both", expand=True)
+
+        # Layers stay at the document size; the canvas shows them through a view scale
+        self.canvas_width, self.canvas_height = 600, 400
+        self.doc_size = (self.canvas_width, self.canvas_height)
+        self.view_scale = 1.0
+        self.configure_after = None
+        # Grey around the (white) page, so its edge is visible when the canvas is larger
+        self.canvas = tk.Canvas(main_drawing_frame, width=self.canvas_width, height=self.canvas_height, bg="gray75")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.canvas.bind("<Configure>", self.on_canvas_configure)
+
+        # Layer management UI
+        layer_frame = tk.Frame(main_drawing_frame, bg=self.theme['bg_right_start'], bd=2, relief="sunken")
+        layer_frame.pack(side="right", fill="y", padx=(10, 0))
+        tk.Label(layer_frame, text="Layers", font=self.app.font_main, bg=self.theme['bg_right_start'], fg=self.theme['text_fg']).pack(pady=5)
+        self.layer_listbox = tk.Listbox(layer_frame, selectmode="browse", font=self.app.font_main, bg=self.theme['text_bg'], fg=self.theme['text_fg'])
+        self.layer_listbox.pack(pady=5, padx=5, fill="y", expand=True)
+        self.layer_listbox.bind("<<ListboxSelect>>", self.on_layer_select)
+
+        layer_button_frame = tk.Frame(layer_frame, bg=self.theme['bg_right_start'])
+        layer_button_frame.pack(pady=5)
+        tk.Button(layer_button_frame, text="+", command=self.add_layer, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
+        tk.Button(layer_button_frame, text="-", command=self.remove_layer, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
+        tk.Button(layer_button_frame, text="↑", command=self.move_layer_up, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
+        tk.Button(layer_button_frame, text="↓", command=self.move_layer_down, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
+
+        self.layers = []
+        self.active_layer_index = 0
+        self.composite_image = None
+        self.canvas_image = None
+        self.layer_cache = None  # (below, above) flattened around the active layer
+        self.history = None  # created after loading so the initial layers aren't undoable
+        self.stroke = None
+
+        self.blank_document = False  # a new drawing, sized to the canvas until it is first edited
+        if os.path.exists(self.layers_path) or os.path.exists(self.draw_path):
+            self.load_drawing()
+        else:
+            self.add_layer("Background")
+            self.blank_document = True
+        self.history = History(int(self.app.config.get("undo_budget_mb", 64) * 1024 * 1024))
+        self.update_view()
+
+        self.update_layer_listbox()
+        self.composite_layers()
+
+        self.start_x, self.start_y = None, None
+        self.last_point = None
+        self.stroke_engine = StrokeEngine(self, self.paint_points)
+        self.preview_shape = None
+        self.preview_circle = self.canvas.create_oval(0, 0, 0, 0, outline="black", width=1)
+        self.overlay = None
+        if PROFILER.enabled:
+            self.overlay = self.canvas.create_text(6, 6, anchor="nw", font=("Courier", 9), fill="red")
+            self.update_overlay()
+
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        self.canvas.bind("<Motion>", self.update_preview)
+
+        # Tools frame
+        tools_frame = tk.Frame(self, bg=self.theme['bg_right_start'])
+        tools_frame.pack(pady=5)
+
+        self.tool_buttons = {}
+        for tool_name in ["Brush", "Eraser", "Fill"]:
+            btn = tk.Button(tools_frame, text=tool_name,
+                            command=lambda t=tool_name.lower(): self.select_tool(t),
+                            bg=self.theme['button_color'], activebackground=self.theme['active_button'])
+            btn.pack(side="left", padx=5)
+            self.tool_buttons[tool_name.lower()] = btn
+
+        self.shape_var = tk.StringVar(value="Line")
+        self.shape_options = [name.title() for name in SHAPE_TOOLS]
+        shape_menu = tk.OptionMenu(tools_frame, self.shape_var, *self.shape_options, command=self.select_shape_tool)
+        shape_menu.pack(side="left", padx=5)
+        self.tool_buttons["shape"] = shape_menu
+
+        self.color_btn = tk.Button(tools_frame, text="Color", bg=self.app.brush_color, command=self.choose_color)
+        self.color_btn.pack(side="left", padx=5)
+
+        # Size and opacity frame
+        self.size_frame = tk.Frame(self, bg=self.theme['bg_right_start'])
+        self.size_frame.pack(pady=5)
+        self.opacity_var = tk.IntVar(value=255)
+        tk.Label(self.size_frame, text="Opacity", bg=self.theme['bg_right_start'], fg=self.theme['text_fg']).pack(side="left")
+        tk.Scale(self.size_frame, from_=0, to=255, orient="horizontal", variable=self.opacity_var,
+                 bg=self.theme['bg_right_start'], fg=self.theme['text_fg'], troughcolor=self.theme['button_color']).pack(side="left", padx=5)
+        self.scale_var = tk.IntVar()
+        self.fill_tolerance = tk.IntVar(value=self.app.config.get("fill_tolerance", 32))
+        self.fill_sample_merged = tk.BooleanVar(value=False)
+        self.update_size_frame()
+        self.select_tool("brush")  # Select brush by default
+
+        # Bottom actions
+        action_frame = tk.Frame(self, bg=self.theme['bg_right_start'])
+        action_frame.pack(pady=5)
+        tk.Button(action_frame, text="Undo", command=self.undo_action, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=5)
+        tk.Button(action_frame, text="Redo", command=self.redo_action, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=5)
+        tk.Button(action_frame, text="Clear", command=self.clear_action, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=5)
+        tk.Button(action_frame, text="💾 Save", command=self.save_drawing, bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=5)
+
+    def update_overlay(self):
+        # Frames are presents (full or partial) per second; latencies are the last and p90 of each handler
+        if not self.winfo_exists():
+            return
+        parts = [f"{PROFILER.rate('present'):.0f} fps"]
+        for name in ("on_drag", "composite_layers", "present"):
+            st = PROFILER.stats(name)
+            if st:
+                parts.append(f"{name} {st['last']:.1f}/{st['p90']:.1f} ms")
+        self.canvas.itemconfigure(self.overlay, text="\n".join(parts))
+        self.canvas.tag_raise(self.overlay)
+        self.app.root.after(500, self.update_overlay)
+
+    def on_canvas_configure(self, event):
+        new_width = event.width
+        new_height = event.height
+        if new_width != self.canvas_width or new_height != self.canvas_height:
+            self.canvas_width = new_width
+            self.canvas_height = new_height
+            # Rescale the displayed composite once the burst of resize events settles
+            if self.configure_after:
+                self.after_cancel(self.configure_after)
+            self.configure_after = self.after(100, self.update_view)
+
+    def update_view(self):
+        """Fit the document into the canvas (never upscaling) and redraw the scaled preview once."""
+        self.configure_after = None
+        if self.blank_document and self.stroke is None and not (self.history.undo_stack or self.history.redo_stack):
+            # Nothing drawn yet: follow the canvas's settled size so all of it is paintable
+            if self.doc_size != (self.canvas_width, self.canvas_height):
+                self.doc_size = (self.canvas_width, self.canvas_height)
+                for layer in self.layers:
+                    layer['tiles'] = TiledLayer(self.doc_size)
+                self.invalidate_layer_cache()
+                self.composite_layers()
+        doc_w, doc_h = self.doc_size
+        scale = min(1.0, self.canvas_width / doc_w, self.canvas_height / doc_h)
+        if scale != self.view_scale:
+            self.view_scale = scale
+            self.present()
+
+    def to_doc(self, x, y):
+        return (int(x / self.view_scale), int(y / self.view_scale))
+
+    def on_press(self, event):
+        self.begin_stroke()
+        self.start_x, self.start_y = event.x, event.y
+        self.last_point = self.to_doc(event.x, event.y)
+        if self.app.current_tool in ["brush", "eraser"]:
+            self.stroke_engine.begin(self.last_point)
+        elif self.app.current_tool == "fill":
+            self.fill(*self.last_point)
+            self.end_stroke()
+        elif self.app.current_tool in SHAPE_TOOLS:
+            self.preview_shape = self.create_preview_shape()
+
+    @PROFILER.timed("on_drag")
+    def on_drag(self, event):
+        if self.app.current_tool == "brush" or self.app.current_tool == "eraser":
+            # Only queue the sample; the stroke engine rasterizes once per frame
+            self.stroke_engine.add(self.to_doc(event.x, event.y))
+            self.update_preview(event)
+        elif self.app.current_tool in SHAPE_TOOLS and self.preview_shape:
+            # Move the one preview item rather than recreating it on every motion event
+            self.canvas.coords(self.preview_shape, *self.preview_coords(event.x, event.y))
+
+    def on_release(self, event):
+        if self.app.current_tool in SHAPE_TOOLS:
+            self.draw_shape(*self.to_doc(self.start_x, self.start_y), *self.to_doc(event.x, event.y))
+            if self.preview_shape:
+                self.canvas.delete(self.preview_shape)
+                self.preview_shape = None
+            self.composite_layers()
+        elif self.app.current_tool in ["brush", "eraser"]:
+            self.stroke_engine.end()
+        self.end_stroke()
+        self.start_x, self.start_y = None, None
+        self.last_point = None
+
+    def get_brush_color(self):
+        color = self.app.brush_color
+        if isinstance(color, str) and color.startswith('#'):
+            r = int(color[1:3], 16)
+            g = int(color[3:5], 16)
+            b = int(color[5:7], 16)
+            return (r, g, b, int(self.opacity_var.get()))
+        return (0, 0, 0, int(self.opacity_var.get()))
+
+    def edit_active_layer(self, bbox, draw_fn):
+        """
+        Copy bbox out of the active layer's tiles, let draw_fn(draw, ox, oy)
+        paint on it in coordinates offset by (ox, oy), and write it back.
+        Returns the clipped bbox that was edited, or None.
+        """
+        tiles = self.layers[self.active_layer_index]['tiles']
+        bbox = tiles.clip(bbox)
+        if bbox is None:
+            return None
+        region = tiles.crop(bbox)
+        draw_fn(ImageDraw.Draw(region), bbox[0], bbox[1])
+        tiles.write(region, bbox[:2])
+        return bbox
+
+    @PROFILER.timed("paint")
+    def paint_points(self, points):
+        """Rasterize one batch of a stroke (a smoothed polyline in document coordinates) and show it."""
+        if not self.layers:
+            return
+        color = self.get_brush_color() if self.app.current_tool == "brush" else (0, 0, 0, 0)
+        width = int(self.app.brush_width if self.app.current_tool == "brush" else self.app.eraser_width)
+        pad = width // 2 + 2
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+
+        def draw_fn(draw, ox, oy):
+            local = [(x - ox, y - oy) for x, y in points]
+            if len(local) > 1:
+                draw.line(local, fill=color, width=width, joint="curve")
+            # Round caps, which also join this batch smoothly onto the previous one
+            r = max(width / 2 - 0.5, 0)
+            for x, y in (local[0], local[-1]):
+                draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+
+        bbox = self.edit_active_layer((min(xs) - pad, min(ys) - pad, max(xs) + pad + 1, max(ys) + pad + 1), draw_fn)
+        if bbox:
+            self.composite_layers(bbox)
+
+    @PROFILER.timed("fill")
+    def fill(self, x, y):
+        """
+        Flood-fill the active layer from (x, y), matching colors within the
+        tolerance on the active layer or on the merged image. Only the
+        filled bbox is rewritten and re-composited; it is returned (None if
+        nothing was filled).
+        """
+        if not self.layers:
+            return None
+        tiles = self.layers[self.active_layer_index]['tiles']
+        if self.fill_sample_merged.get() and self.composite_image is not None:
+            source, alpha = self.composite_image, False  # flattened on white, always opaque
+        else:
+            source, alpha = tiles.to_image(), True
+        mask, bbox = flood_fill_mask(source, (x, y), int(self.fill_tolerance.get()), alpha)
+        if bbox is None:
+            return None
+        region = tiles.crop(bbox)
+        # Pasting a solid image through the mask is several times faster than pasting a color
+        region.paste(Image.new("RGBA", region.size, self.get_brush_color()), (0, 0), mask)
+        tiles.write(region, bbox[:2])
+        self.composite_layers(bbox)
+        return bbox
+
+    def draw_shape(self, x1, y1, x2, y2):
+        if self.layers:
+            color = self.get_brush_color()
+            width = int(self.app.brush_width)
+            tool = self.app.current_tool
+            shape = SHAPES.get(tool)
+            if shape:
+                points = shape.place(x1, y1, x2, y2)
+                xs, ys = [x for x, _ in points], [y for _, y in points]
+                bbox = (int(min(xs)) - width, int(min(ys)) - width, int(max(xs)) + width + 1, int(max(ys)) + width + 1)
+            else:
+                bbox = (min(x1, x2) - width, min(y1, y2) - width, max(x1, x2) + width + 1, max(y1, y2) + width + 1)
+
+            def draw_fn(draw, ox, oy):
+                if shape:
+                    moved = [(x - ox, y - oy) for x, y in points]
+                    if shape.curved:
+                        draw.line(moved + moved[:1], fill=color, width=width, joint="curve")
+                    else:
+                        draw.polygon(moved, outline=color, width=width)
+                    return
+                a, b, c, d = x1 - ox, y1 - oy, x2 - ox, y2 - oy
+                if tool == "line":
+                    draw.line((a, b, c, d), fill=color, width=width)
+                elif tool == "rectangle":
+                    draw.rectangle((min(a, c), min(b, d), max(a, c), max(b, d)), outline=color, width=width)
+                elif tool == "oval":
+                    draw.ellipse((min(a, c), min(b, d), max(a, c), max(b, d)), outline=color, width=width)
+
+            self.edit_active_layer(bbox, draw_fn)
+
+    def preview_coords(self, x, y):
+        shape = SHAPES.get(self.app.current_tool)
+        if not shape:
+            return self.start_x, self.start_y, x, y
+        coords = shape.coords(self.start_x, self.start_y, x, y)
+        return coords + coords[:2] if shape.curved else coords
+
+    def create_preview_shape(self):
+        """The canvas item that previews a shape drag; on_drag only moves its coordinates."""
+        tool = self.app.current_tool
+        color = self.app.brush_color
+        width = int(self.app.brush_width)
+        coords = self.preview_coords(self.start_x, self.start_y)
+        if tool == "line" or (tool in SHAPES and SHAPES[tool].curved):
+            return self.canvas.create_line(*coords, fill=color, width=width, joinstyle="round")
+        elif tool == "rectangle":
+            return self.canvas.create_rectangle(*coords, outline=color, width=width)
+        elif tool == "oval":
+            return self.canvas.create_oval(*coords, outline=color, width=width)
+        return self.canvas.create_polygon(*coords, fill="", outline=color, width=width)
+
+    def update_preview(self, event=None):
+        if event:
+            x, y = event.x, event.y
+        else:
+            x = self.canvas.winfo_pointerx() - self.canvas.winfo_rootx()
+            y = self.canvas.winfo_pointery() - self.canvas.winfo_rooty()
+        page_w, page_h = self.doc_size[0] * self.view_scale, self.doc_size[1] * self.view_scale
+        if self.app.current_tool in ["brush", "eraser"] and 0 <= x < page_w and 0 <= y < page_h:
+            width = self.app.brush_width if self.app.current_tool == "brush" else self.app.eraser_width
+            radius = width * self.view_scale / 2
+            color = self.app.brush_color if self.app.current_tool == "brush" else "gray"
+            self.canvas.coords(self.preview_circle, x - radius, y - radius, x + radius, y + radius)
+            self.canvas.itemconfig(self.preview_circle, outline=color)
+            self.canvas.tag_raise(self.preview_circle)
+        else:
+            self.canvas.coords(self.preview_circle, -10, -10, -10, -10)
+
+    def select_tool(self, tool):
+        self.app.current_tool = tool
+        for t, btn in self.tool_buttons.items():
+            if t != "shape":
+                btn.config(bg=self.theme['active_button'] if t == tool else self.theme['button_color'])
+        self.update_size_frame()
+
+    def select_shape_tool(self, shape):
+        self.select_tool(shape.lower())
+
+    def update_size_frame(self):
+        for widget in self.size_frame.winfo_children():
+            widget.destroy()
+        tk.Label(self.size_frame, text="Opacity", bg=self.theme['bg_right_start'], fg=self.theme['text_fg']).pack(side="left")
+        tk.Scale(self.size_frame, from_=0, to=255, orient="horizontal", variable=self.opacity_var,
+                 bg=self.theme['bg_right_start'], fg=self.theme['text_fg'], troughcolor=self.theme['button_color']).pack(side="left", padx=5)
+        if self.app.current_tool in ["brush", "eraser"] + SHAPE_TOOLS:
+            preset_sizes = [1, 5, 10, 20]
+            for s in preset_sizes:
+                tk.Button(self.size_frame, text=str(s),
+                          command=lambda val=s: self.set_size(val, update_slider=True),
+                          bg=self.theme['button_color'], activebackground=self.theme['active_button']).pack(side="left", padx=2)
+            current_width = self.app.brush_width if self.app.current_tool in ["brush"] + SHAPE_TOOLS else self.app.eraser_width
+            self.scale_var.set(int(current_width))
+            scale = tk.Scale(self.size_frame, from_=1, to=50, orient="horizontal", resolution=1,
+                             variable=self.scale_var,
+                             command=lambda val: self.set_size(int(val), update_slider=False),
+                             bg=self.theme['bg_right_start'], fg=self.theme['text_fg'], troughcolor=self.theme['button_color'])
+            scale.pack(side="left", padx=5)
+        elif self.app.current_tool == "fill":
+            tk.Label(self.size_frame, text="Tolerance", bg=self.theme['bg_right_start'], fg=self.theme['text_fg']).pack(side="left")
+            tk.Scale(self.size_frame, from_=0, to=255, orient="horizontal", variable=self.fill_tolerance,
+                     bg=self.theme['bg_right_start'], fg=self.theme['text_fg'], troughcolor=self.theme['button_color']).pack(side="left", padx=5)
+            tk.Checkbutton(self.size_frame, text="Sample merged", variable=self.fill_sample_merged,
+                           bg=self.theme['bg_right_start'], fg=self.theme['text_fg'],
+                           activebackground=self.theme['bg_right_start']).pack(side="left", padx=5)
+
+    def set_size(self, val, update_slider=True):
+        if self.app.current_tool in ["brush"] + SHAPE_TOOLS:
+            self.app.brush_width = int(val)
+        elif self.app.current_tool == "eraser":
+            self.app.eraser_width = int(val)
+        if update_slider:
+            self.scale_var.set(int(val))
+
+    def choose_color(self):
+        color = colorchooser.askcolor(color=self.app.brush_color, parent=self)[1]
+        if color:
+            self.app.brush_color = color
+            self.color_btn.config(bg=color)
+
+    # ---------------- Undo / Redo ----------------
+    def begin_stroke(self):
+        # Tiles are replaced rather than modified, so a dict copy is enough to diff against on release
+        if self.layers:
+            layer = self.layers[self.active_layer_index]
+            self.stroke = {'layer': layer, 'before': layer['tiles'].snapshot()}
+
+    def end_stroke(self):
+        stroke, self.stroke = self.stroke, None
+        if stroke is None:
+            return
+        tiles = stroke['layer']['tiles']
+        changed = tiles.changed_tiles(stroke['before'])
+        if changed:
+            before = {k: stroke['before'].get(k) for k in changed}
+            after = {k: tiles.tiles.get(k) for k in changed}
+            self.history.push(StrokeOp(stroke['layer'], before, after))
+
+    def undo_action(self):
+        self.history.undo(self)
+
+    def redo_action(self):
+        self.history.redo(self)
+
+    def refresh_after_history(self, layer, bbox):
+        if layer is self.layers[self.active_layer_index]:
+            self.composite_layers(bbox)
+        else:
+            self.invalidate_layer_cache()
+            self.composite_layers()
+
+    def set_active_layer(self, index):
+        self.active_layer_index = max(0, index)
+        self.invalidate_layer_cache()
+        self.update_layer_listbox()
+        self.composite_layers()
+
+    def clear_action(self):
+        if self.layers:
+            self.begin_stroke()
+            self.layers[self.active_layer_index]['tiles'].clear()
+            self.end_stroke()
+            self.composite_layers()
+
+    def save_drawing(self):
+        # Layers go to the native file; the flattened PNG is kept as an export/thumbnail.
+        # Tiles are never modified in place, so a shallow snapshot is safe to encode on the writer thread.
+        layers = [{'name': layer['name'],
+                   'tiles': TiledLayer(self.doc_size, layer['tiles'].snapshot(), layer['tiles'].opacity)}
+                  for layer in self.layers]
+        doc_size, layers_path, date_str = self.doc_size, self.layers_path, self.date_str
+        app = self.app
+
+        def write_drawing():
+            save_document(layers_path, layers, doc_size)
+            final_image = Image.new("RGBA", doc_size, (255, 255, 255, 255))
+            for layer in reversed(layers):
+                layer['tiles'].composite_into(final_image)
+            # The export is content-addressed, so identical drawings share one PNG
+            return app.drawing_media.add_image(final_image.convert("RGB"))
+
+        def drawing_stored(export_path):
+            app.set_entry_media(date_str, "drawing_export", app.drawing_media, export_path, drawing_path=layers_path)
+
+        self.app.writer.submit(("drawing", self.layers_path), write_drawing, drawing_stored)
+
+    def load_drawing(self):
+        if os.path.exists(self.layers_path):
+            self.doc_size, self.layers = load_document(self.layers_path)
+            self.set_active_layer(0)
+            return
+        try:
+            loaded_image = Image.open(self.draw_path).convert("RGBA")
+            self.doc_size = loaded_image.size
+            self.add_layer("Loaded Drawing", image=loaded_image)
+        except FileNotFoundError:
+            self.add_layer("Background")
+
+    def add_layer(self, name=None, image=None):
+        if name is None:
+            name = f"Layer {len(self.layers) + 1}"
+        if image is None:
+            tiles = TiledLayer(self.doc_size)
+        else:
+            tiles = TiledLayer.from_image(image)
+        insert_index = max(0, self.active_layer_index)
+        layer = {'name': name, 'tiles': tiles}
+        self.layers.insert(insert_index, layer)
+        if self.history:
+            self.history.push(AddLayerOp(layer, insert_index))
+        self.set_active_layer(insert_index)
+
+    def remove_layer(self):
+        if len(self.layers) > 0 and self.active_layer_index is not None:
+            layer = self.layers.pop(self.active_layer_index)
+            replacement = None
+            if not self.layers:
+                # Never leave the drawing without a layer; undo brings the old one back in its place
+                replacement = {'name': "Background", 'tiles': TiledLayer(self.doc_size)}
+                self.layers.append(replacement)
+            self.history.push(RemoveLayerOp(layer, self.active_layer_index, replacement))
+            if self.active_layer_index >= len(self.layers):
+                self.active_layer_index = len(self.layers) - 1
+            self.invalidate_layer_cache()
+            self.update_layer_listbox()
+            self.composite_layers()
+
+    def move_layer_up(self):
+        if self.active_layer_index > 0:
+            self.history.push(MoveLayerOp(self.layers[self.active_layer_index], self.active_layer_index, self.active_layer_index - 1))
+            self.layers.insert(self.active_layer_index - 1, self.layers.pop(self.active_layer_index))
+            self.active_layer_index -= 1
+            self.invalidate_layer_cache()
+            self.update_layer_listbox()
+            self.composite_layers()
+
+    def move_layer_down(self):
+        if self.active_layer_index < len(self.layers) - 1:
+            self.history.push(MoveLayerOp(self.layers[self.active_layer_index], self.active_layer_index, self.active_layer_index + 1))
+            self.layers.insert(self.active_layer_index + 1, self.layers.pop(self.active_layer_index))
+            self.active_layer_index += 1
+            self.invalidate_layer_cache()
+            self.update_layer_listbox()
+            self.composite_layers()
+
+    def on_layer_select(self, event):
+        if self.layer_listbox.curselection():
+            self.active_layer_index = self.layer_listbox.curselection()[0]
+            self.invalidate_layer_cache()
+
+    def update_layer_listbox(self):
+        self.layer_listbox.delete(0, "end")
+        for i, layer in enumerate(self.layers):
+            self.layer_listbox.insert("end", layer['name'])
+            if i == self.active_layer_index:
+                self.layer_listbox.selection_set(i)
+                self.layer_listbox.activate(i)
+
+    def invalidate_layer_cache(self):
+        # Called whenever the layer structure or the active layer changes
+        self.layer_cache = None
+
+    def get_layer_cache(self):
+        """
+        Flattened images of every layer below the active one (on white) and
+        every layer above it (None when nothing is painted above), so a
+        stroke on the active layer only needs three images blended
+        regardless of the layer count.
+        """
+        if self.layer_cache is None:
+            size = self.doc_size
+            below = Image.new("RGBA", size, (255, 255, 255, 255))
+            for layer in reversed(self.layers[self.active_layer_index + 1:]):
+                layer['tiles'].composite_into(below)
+            above = None
+            if any(layer['tiles'].tiles for layer in self.layers[:self.active_layer_index]):
+                above = Image.new("RGBA", size, (0, 0, 0, 0))
+                for layer in reversed(self.layers[:self.active_layer_index]):
+                    layer['tiles'].composite_into(above)
+            self.layer_cache = (below, above)
+        return self.layer_cache
+
+    @PROFILER.timed("composite_layers")
+    def composite_layers(self, bbox=None):
+        """
+        Re-composite the layers into the document-sized composite. With a
+        bbox only that region is blended and shown; without one the whole
+        document is redone.
+        """
+        size = self.doc_size
+        below, above = self.get_layer_cache()
+        active = self.layers[self.active_layer_index]['tiles']
+        if bbox is None or self.composite_image is None or self.composite_image.size != size:
+            composite_image = below.copy()
+            active.composite_into(composite_image)
+            if above is not None:
+                composite_image.alpha_composite(above)
+            self.composite_image = composite_image
+            self.present()
+            return
+
+        x0, y0 = max(0, int(bbox[0])), max(0, int(bbox[1]))
+        x1, y1 = min(size[0], int(bbox[2])), min(size[1], int(bbox[3]))
+        if x1 <= x0 or y1 <= y0:
+            return
+        region = below.crop((x0, y0, x1, y1))
+        active.composite_into(region, (x0, y0, x1, y1))
+        if above is not None:
+            region.alpha_composite(above, source=(x0, y0, x1, y1))
+        self.composite_image.paste(region, (x0, y0))
+        self.present((x0, y0, x1, y1), region)
+
+    @PROFILER.timed("present")
+    def present(self, bbox=None, region=None):
+        """
+        Show the composite on the canvas through the view scale. The scaled
+        preview lives in one PhotoImage; a bbox only refreshes that part.
+        """
+        if self.composite_image is None:
+            return
+        scale = self.view_scale
+        doc_w, doc_h = self.doc_size
+        display_size = (max(1, round(doc_w * scale)), max(1, round(doc_h * scale)))
+        if bbox is None:
+            if scale == 1.0:
+                display = self.composite_image
+            else:
+                display = self.composite_image.resize(display_size, Image.Resampling.BILINEAR)
+            if self.canvas_image is None or (self.tk_img.width(), self.tk_img.height()) != display_size:
+                self.tk_img = ImageTk.PhotoImage(display)
+                if self.canvas_image is None:
+                    self.canvas_image = self.canvas.create_image(0, 0, image=self.tk_img, anchor="nw")
+                    self.canvas.tag_lower(self.canvas_image)
+                else:
+                    self.canvas.itemconfig(self.canvas_image, image=self.tk_img)
+            else:
+                self.tk_img.paste(display)
+            return
+
+        if scale == 1.0 and region is not None:
+            patch_image, dx0, dy0 = region, bbox[0], bbox[1]
+        else:
+            dx0, dy0 = int(bbox[0] * scale), int(bbox[1] * scale)
+            dx1 = min(display_size[0], math.ceil(bbox[2] * scale))
+            dy1 = min(display_size[1], math.ceil(bbox[3] * scale))
+            if dx1 <= dx0 or dy1 <= dy0:
+                return
+            source_box = (dx0 / scale, dy0 / scale, dx1 / scale, dy1 / scale)
+            patch_image = self.composite_image.resize((dx1 - dx0, dy1 - dy0), Image.Resampling.BILINEAR, box=source_box)
+        patch = ImageTk.PhotoImage(patch_image)
+        self.canvas.tk.call(str(self.tk_img), "copy", str(patch), "-to", dx0, dy0)
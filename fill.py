@@ -0,0 +1,74 @@
+from PIL import Image, ImageChops
+
+OUTSIDE = 0
+INSIDE = 255
+
+
+def tolerance_mask(image, seed, tolerance, alpha=True):
+    """
+    One byte per pixel of an RGBA image: INSIDE where every channel is
+    within tolerance of the seed pixel, OUTSIDE elsewhere. Built from
+    whole-image PIL operations: a per-channel lookup table, then the
+    channels are combined (a weighted sum of 255s is only 255 if every
+    term is). Pass alpha=False for opaque images to skip the alpha test.
+    """
+    target = image.getpixel(seed)
+    lut = []
+    for channel in target:
+        lut += [INSIDE if abs(v - channel) <= tolerance else OUTSIDE for v in range(256)]
+    within = image.point(lut)
+    combined = within.convert("L")  # RGB only
+    if alpha:
+        combined = ImageChops.darker(combined, within.getchannel("A"))
+    return combined.point([INSIDE if v == 255 else OUTSIDE for v in range(256)]).tobytes()
+
+
+def scanline_fill(mask, width, height, seed):
+    """
+    Scanline flood fill over a tolerance mask, 4-connected. Each run of
+    pixels is found and claimed with bytes find/slice operations rather
+    than pixel by pixel. Returns a byte mask with INSIDE on the filled
+    pixels.
+    """
+    filled = bytearray(width * height)
+    full_row = memoryview(bytes([INSIDE]) * width)
+    stack = [seed]
+    while stack:
+        x, y = stack.pop()
+        row = y * width
+        if filled[row + x] or mask[row + x] != INSIDE:
+            continue
+        left = mask.rfind(OUTSIDE, row, row + x)
+        left = row if left == -1 else left + 1
+        right = mask.find(OUTSIDE, row + x, row + width)
+        if right == -1:
+            right = row + width
+        filled[left:right] = full_row[:right - left]
+        for ny in (y - 1, y + 1):
+            if 0 <= ny < height:
+                offset = ny * width - row
+                pos, end = left + offset, right + offset
+                while pos < end:
+                    pos = mask.find(INSIDE, pos, end)
+                    if pos == -1:
+                        break
+                    if not filled[pos]:
+                        stack.append((pos - ny * width, ny))
+                    run_end = mask.find(OUTSIDE, pos, end)
+                    pos = end if run_end == -1 else run_end
+    return filled
+
+
+def flood_fill_mask(source, seed, tolerance, alpha=True):
+    """(mask, bbox): an "L" mask of the region to fill, cropped to its bbox, or (None, None)."""
+    width, height = source.size
+    if not (0 <= seed[0] < width and 0 <= seed[1] < height):
+        return None, None
+    if source.mode != "RGBA":
+        source = source.convert("RGBA")
+    mask = tolerance_mask(source, seed, tolerance, alpha)
+    filled = Image.frombytes("L", (width, height), scanline_fill(mask, width, height, seed))
+    bbox = filled.getbbox()
+    if bbox is None:
+        return None, None
+    return filled.crop(bbox), bbox
@@ -0,0 +1,45 @@
+from collections import OrderedDict
+
+
+def render_gradient(start_rgb, end_rgb, width, height):
+    """
+    Vertical gradient from start_rgb (top) to end_rgb (bottom), built in C:
+    a 1xN column is colored through per-channel lookup tables and then
+    stretched to full width, instead of drawing one line per pixel row.
+    """
+    from PIL import Image  # imported on first use, after the window is already up
+    ramp = Image.linear_gradient("L").resize((1, height), Image.Resampling.BILINEAR)
+    channels = [ramp.point([round(a + (b - a) * v / 255) for v in range(256)])
+                for a, b in zip(start_rgb, end_rgb)]
+    column = Image.merge("RGB", channels)
+    return column.resize((width, height), Image.Resampling.NEAREST)
+
+
+class GradientRenderer:
+    """Turns (start, end, width, height) into PhotoImages, keeping the most recent ones in an LRU cache."""
+
+    def __init__(self, root, maxsize=24):
+        self.root = root
+        self.maxsize = maxsize
+        self._rgb = {}
+        self._cache = OrderedDict()
+
+    def rgb(self, color):
+        # winfo_rgb returns 0-65535 per channel
+        if color not in self._rgb:
+            self._rgb[color] = tuple(v >> 8 for v in self.root.winfo_rgb(color))
+        return self._rgb[color]
+
+    def photo(self, start_color, end_color, width, height):
+        key = (start_color, end_color, width, height)
+        tk_image = self._cache.get(key)
+        if tk_image is not None:
+            self._cache.move_to_end(key)
+            return tk_image
+        from PIL import ImageTk
+        image = render_gradient(self.rgb(start_color), self.rgb(end_color), width, height)
+        tk_image = ImageTk.PhotoImage(image)
+        self._cache[key] = tk_image
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return tk_image
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+from PIL import Image, ImageDraw
+
+CELL = 11
+GAP = 2
+PITCH = CELL + GAP
+LABEL_W = 40
+HEADER_H = 16
+YEAR_H = HEADER_H + 7 * PITCH + 6
+
+
+def year_origin(year):
+    # Column 0 is the week holding Jan 1st; rows are Monday..Sunday like the calendar
+    return date(year, 1, 1) - timedelta(days=date(year, 1, 1).weekday())
+
+
+class Heatmap:
+    """
+    Year-per-row mood heatmap (weeks across, weekdays down) drawn into one
+    PIL image. Images are cached by (years, colors, data version), so
+    reopening the view or switching back to a range costs nothing, and
+    hit_test() maps a click back to its date without any per-day widgets.
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def size(self, years):
+        return LABEL_W + 54 * PITCH, len(years) * YEAR_H
+
+    def render(self, years, days, version, colors):
+        """years newest first; days maps "YYYY-MM-DD" -> mood; colors maps mood (and "empty", "bg", "fg") -> color."""
+        key = (tuple(years), tuple(sorted(colors.items())), version)
+        image = self._cache.get(key)
+        if image is not None:
+            self._cache.move_to_end(key)
+            return image
+        image = Image.new("RGB", self.size(years), colors["bg"])
+        draw = ImageDraw.Draw(image)
+        for row, year in enumerate(years):
+            top = row * YEAR_H
+            draw.text((4, top + HEADER_H), str(year), fill=colors["fg"])
+            day = date(year, 1, 1)
+            origin = year_origin(year)
+            while day.year == year:
+                offset = (day - origin).days
+                x = LABEL_W + (offset // 7) * PITCH
+                y = top + HEADER_H + (offset % 7) * PITCH
+                if day.day == 1:
+                    draw.text((x, top + 2), day.strftime("%b"), fill=colors["fg"])
+                fill = colors.get(days.get(day.isoformat()), colors["empty"])
+                draw.rectangle((x, y, x + CELL - 1, y + CELL - 1), fill=fill)
+                day += timedelta(days=1)
+        self._cache[key] = image
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return image
+
+    def hit_test(self, years, x, y):
+        """The date drawn under image coordinates (x, y), or None."""
+        row, y_in = divmod(int(y), YEAR_H)
+        if row < 0 or row >= len(years) or x < LABEL_W:
+            return None
+        week, x_in = divmod(int(x) - LABEL_W, PITCH)
+        weekday, y_cell = divmod(y_in - HEADER_H, PITCH)
+        if y_in < HEADER_H or weekday > 6 or x_in >= CELL or y_cell >= CELL:
+            return None
+        day = year_origin(years[row]) + timedelta(days=week * 7 + weekday)
+        return day if day.year == years[row] else None
@@ -0,0 +1,114 @@
+from collections import deque
+from layers import TILE_BYTES
+
+
+# ---------------- Operations ----------------
+# Each operation knows how to undo/redo itself on a DrawingWindow and
+# reports how many bytes it keeps alive, so History can stay in budget.
+
+class StrokeOp:
+    """The tiles of one layer that a stroke replaced, before and after."""
+
+    def __init__(self, layer, before, after):
+        self.layer = layer
+        self.before = before
+        self.after = after
+        self.nbytes = TILE_BYTES * sum(1 for t in list(before.values()) + list(after.values()) if t is not None)
+
+    def undo(self, window):
+        self.layer['tiles'].set_tiles(self.before)
+        window.refresh_after_history(self.layer, self.layer['tiles'].keys_bbox(list(self.before)))
+
+    def redo(self, window):
+        self.layer['tiles'].set_tiles(self.after)
+        window.refresh_after_history(self.layer, self.layer['tiles'].keys_bbox(list(self.after)))
+
+
+class AddLayerOp:
+    def __init__(self, layer, index):
+        self.layer = layer
+        self.index = index
+        self.nbytes = 64
+
+    def undo(self, window):
+        window.layers.remove(self.layer)
+        window.set_active_layer(min(self.index, len(window.layers) - 1))
+
+    def redo(self, window):
+        window.layers.insert(self.index, self.layer)
+        window.set_active_layer(self.index)
+
+
+class RemoveLayerOp:
+    """Removing a layer; removing the last one also swaps in a blank replacement, in the same step."""
+
+    def __init__(self, layer, index, replacement=None):
+        self.layer = layer
+        self.index = index
+        self.replacement = replacement
+        self.nbytes = layer['tiles'].nbytes
+
+    def undo(self, window):
+        if self.replacement is not None:
+            window.layers.remove(self.replacement)
+        window.layers.insert(self.index, self.layer)
+        window.set_active_layer(self.index)
+
+    def redo(self, window):
+        window.layers.remove(self.layer)
+        if self.replacement is not None:
+            window.layers.append(self.replacement)
+        window.set_active_layer(min(self.index, len(window.layers) - 1))
+
+
+class MoveLayerOp:
+    def __init__(self, layer, from_index, to_index):
+        self.layer = layer
+        self.from_index = from_index
+        self.to_index = to_index
+        self.nbytes = 64
+
+    def undo(self, window):
+        window.layers.remove(self.layer)
+        window.layers.insert(self.from_index, self.layer)
+        window.set_active_layer(self.from_index)
+
+    def redo(self, window):
+        window.layers.remove(self.layer)
+        window.layers.insert(self.to_index, self.layer)
+        window.set_active_layer(self.to_index)
+
+
+# ---------------- History ----------------
+class History:
+    """
+    Undo/redo stacks of operations with a byte budget. When the stacks
+    grow past the budget the oldest undo steps are dropped first.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.nbytes = 0
+
+    def push(self, op):
+        for dropped in self.redo_stack:
+            self.nbytes -= dropped.nbytes
+        self.redo_stack.clear()
+        self.undo_stack.append(op)
+        self.nbytes += op.nbytes
+        while self.nbytes > self.budget_bytes and len(self.undo_stack) > 1:
+            self.nbytes -= self.undo_stack.popleft().nbytes
+
+    def undo(self, window):
+        if self.undo_stack:
+            op = self.undo_stack.pop()
+            op.undo(window)
+            self.redo_stack.append(op)
+
+    def redo(self, window):
+        if self.redo_stack:
+            op = self.redo_stack.pop()
+            op.redo(window)
+            self.undo_stack.append(op)
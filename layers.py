@@ -0,0 +1,172 @@
+import json
+import os
+import zipfile
+from PIL import Image
+
+TILE_SIZE = 64
+TILE_BYTES = TILE_SIZE * TILE_SIZE * 4
+FORMAT_VERSION = 1
+
+
+class TiledLayer:
+    """
+    RGBA layer stored as TILE_SIZE x TILE_SIZE tiles, allocated only where
+    something has been painted. Tiles are never modified in place (edits
+    replace them), so a dict copy of the tiles is a cheap snapshot. Tiles
+    written as fully opaque are flagged (info["opaque"]) so compositing can
+    paste them instead of blending.
+    """
+
+    def __init__(self, size, tiles=None, opacity=255):
+        self.size = size
+        self.opacity = opacity
+        self.tiles = tiles if tiles is not None else {}
+
+    @classmethod
+    def from_image(cls, image):
+        layer = cls(image.size)
+        layer.write(image.convert("RGBA"), (0, 0))
+        return layer
+
+    @property
+    def nbytes(self):
+        return len(self.tiles) * TILE_BYTES
+
+    def clip(self, bbox):
+        x0, y0 = max(0, int(bbox[0])), max(0, int(bbox[1]))
+        x1, y1 = min(self.size[0], int(bbox[2])), min(self.size[1], int(bbox[3]))
+        return (x0, y0, x1, y1) if x1 > x0 and y1 > y0 else None
+
+    def tile_keys(self, bbox):
+        x0, y0, x1, y1 = bbox
+        return [(tx, ty)
+                for ty in range(y0 // TILE_SIZE, (y1 - 1) // TILE_SIZE + 1)
+                for tx in range(x0 // TILE_SIZE, (x1 - 1) // TILE_SIZE + 1)]
+
+    def keys_bbox(self, keys):
+        xs = [tx for tx, _ in keys]
+        ys = [ty for _, ty in keys]
+        return self.clip((min(xs) * TILE_SIZE, min(ys) * TILE_SIZE,
+                          (max(xs) + 1) * TILE_SIZE, (max(ys) + 1) * TILE_SIZE))
+
+    def composite_into(self, dest, bbox=None):
+        """Alpha-composite the painted tiles inside bbox onto dest, whose origin is bbox's top-left."""
+        bbox = self.clip(bbox or (0, 0) + self.size)
+        if bbox is None:
+            return
+        ox, oy = bbox[0], bbox[1]
+        for key in self.tile_keys(bbox):
+            tile = self.tiles.get(key)
+            if tile is None:
+                continue
+            tx0, ty0 = key[0] * TILE_SIZE, key[1] * TILE_SIZE
+            sx0, sy0 = max(bbox[0], tx0), max(bbox[1], ty0)
+            sx1, sy1 = min(bbox[2], tx0 + TILE_SIZE), min(bbox[3], ty0 + TILE_SIZE)
+            source = (sx0 - tx0, sy0 - ty0, sx1 - tx0, sy1 - ty0)
+            if self.opacity < 255:
+                tile = tile.copy()
+                tile.putalpha(tile.getchannel("A").point(lambda a: a * self.opacity // 255))
+            elif tile.info.get("opaque"):
+                # Blending an opaque tile is a copy
+                dest.paste(tile if source == (0, 0, TILE_SIZE, TILE_SIZE) else tile.crop(source), (sx0 - ox, sy0 - oy))
+                continue
+            dest.alpha_composite(tile, dest=(sx0 - ox, sy0 - oy), source=source)
+
+    def crop(self, bbox):
+        """Dense RGBA copy of bbox (transparent where no tile exists)."""
+        region = Image.new("RGBA", (bbox[2] - bbox[0], bbox[3] - bbox[1]), (0, 0, 0, 0))
+        clipped = self.clip(bbox)
+        if clipped is None:
+            return region
+        for key in self.tile_keys(clipped):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                region.paste(tile, (key[0] * TILE_SIZE - bbox[0], key[1] * TILE_SIZE - bbox[1]))
+        return region
+
+    def to_image(self):
+        return self.crop((0, 0) + self.size)
+
+    def write(self, region, origin):
+        """Replace the pixels under region (placed at origin); fully transparent tiles are dropped."""
+        bbox = self.clip((origin[0], origin[1], origin[0] + region.width, origin[1] + region.height))
+        if bbox is None:
+            return
+        # One pass over the region's alpha settles most tiles: all opaque, or all clear
+        region_low, region_high = region.getchannel("A").getextrema()
+        for key in self.tile_keys(bbox):
+            tx0, ty0 = key[0] * TILE_SIZE, key[1] * TILE_SIZE
+            if bbox[0] <= tx0 and bbox[1] <= ty0 and tx0 + TILE_SIZE <= bbox[2] and ty0 + TILE_SIZE <= bbox[3]:
+                # Fully covered: the tile is just that piece of the region
+                if region_high == 0:
+                    self.tiles.pop(key, None)
+                    continue
+                x, y = tx0 - origin[0], ty0 - origin[1]
+                tile = region.crop((x, y, x + TILE_SIZE, y + TILE_SIZE))
+                if region_low == 255:
+                    tile.info["opaque"] = True
+                    self.tiles[key] = tile
+                    continue
+            else:
+                old = self.tiles.get(key)
+                tile = old.copy() if old is not None else Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+                tile.paste(region, (origin[0] - tx0, origin[1] - ty0))
+            low, high = tile.getchannel("A").getextrema()
+            if high == 0:
+                self.tiles.pop(key, None)
+            else:
+                tile.info["opaque"] = low == 255
+                self.tiles[key] = tile
+
+    def snapshot(self):
+        return dict(self.tiles)
+
+    def changed_tiles(self, snapshot):
+        """Keys whose tile differs (by identity) from an earlier snapshot."""
+        keys = set(self.tiles) | set(snapshot)
+        return [k for k in keys if self.tiles.get(k) is not snapshot.get(k)]
+
+    def set_tiles(self, tiles):
+        for key, tile in tiles.items():
+            if tile is None:
+                self.tiles.pop(key, None)
+            else:
+                self.tiles[key] = tile
+
+    def clear(self):
+        self.tiles = {}
+
+
+# ---------------- Native drawing format ----------------
+# A zip container: manifest.json lists the layers top-first (name, opacity,
+# painted tile coordinates) and each layer's tiles are stored as one
+# member of raw RGBA bytes, deflated at a fast level.
+
+def save_document(path, layers, size):
+    manifest = {"version": FORMAT_VERSION, "size": list(size), "tile_size": TILE_SIZE, "layers": []}
+    tmp_path = path + ".tmp"
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        for i, layer in enumerate(layers):
+            tiles = layer['tiles']
+            keys = sorted(tiles.tiles)
+            manifest["layers"].append({"name": layer['name'], "opacity": tiles.opacity,
+                                       "member": f"layer_{i}.rgba", "tiles": [list(k) for k in keys]})
+            zf.writestr(f"layer_{i}.rgba", b"".join(tiles.tiles[k].tobytes() for k in keys))
+        zf.writestr("manifest.json", json.dumps(manifest))
+    os.replace(tmp_path, path)
+
+
+def load_document(path):
+    """Read the manifest and every layer's tiles; returns (size, layers)."""
+    layers = []
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        size = tuple(manifest["size"])
+        tile_size = manifest["tile_size"]
+        tile_bytes = tile_size * tile_size * 4
+        for info in manifest["layers"]:
+            data = zf.read(info["member"])
+            tiles = {tuple(key): Image.frombytes("RGBA", (tile_size, tile_size), data[i * tile_bytes:(i + 1) * tile_bytes])
+                     for i, key in enumerate(info["tiles"])}
+            layers.append({'name': info["name"], 'tiles': TiledLayer(size, tiles, info.get("opacity", 255))})
+    return size, layers
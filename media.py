@@ -0,0 +1,184 @@
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+from collections import OrderedDict
+
+THUMB_SIZE = (300, 300)
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MediaStore:
+    """
+    Content-addressed files: an upload is stored as <sha256><ext>, copied
+    byte for byte, so uploading the same picture twice keeps one copy and
+    two different pictures never overwrite each other. Thumbnails are
+    generated once into a .thumbs cache next to the originals.
+
+    Diary entries reference stored files; the store keeps a reference
+    count per file (persisted in .refs.json) and gc() deletes stored
+    files whose count dropped to zero this session and that no entry
+    still points at.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.thumbs_dir = os.path.join(root_dir, ".thumbs")
+        self.refs_path = os.path.join(root_dir, ".refs.json")
+        os.makedirs(self.thumbs_dir, exist_ok=True)
+        try:
+            with open(self.refs_path, "r", encoding="utf-8") as f:
+                self.refs = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.refs = None  # unknown until rebuild_refs() has seen every entry
+        self.released = set()  # names whose count reached zero this session: gc() candidates
+
+    def add_file(self, src_path):
+        digest = file_digest(src_path)
+        ext = os.path.splitext(src_path)[1].lower()
+        dest = os.path.join(self.root_dir, digest + ext)
+        if not os.path.exists(dest):
+            tmp_path = dest + ".tmp"
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, dest)
+        return dest
+
+    def add_bytes(self, data, ext):
+        dest = os.path.join(self.root_dir, hashlib.sha256(data).hexdigest() + ext)
+        if not os.path.exists(dest):
+            tmp_path = dest + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, dest)
+        return dest
+
+    def add_image(self, image, format="PNG"):
+        buf = io.BytesIO()
+        image.save(buf, format=format)
+        return self.add_bytes(buf.getvalue(), "." + format.lower())
+
+    # ---------------- Reference counts ----------------
+    def _ref_key(self, path):
+        if path and os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.root_dir):
+            return os.path.basename(path)
+        return None
+
+    def retarget(self, old_path, new_path):
+        """An entry switched from old_path to new_path. Returns the refs as JSON text to persist."""
+        if self.refs is None:
+            return None  # counts are rebuilt from all entries before the first gc()
+        old_key, new_key = self._ref_key(old_path), self._ref_key(new_path)
+        if old_key == new_key:
+            return None
+        if new_key:
+            self.refs[new_key] = self.refs.get(new_key, 0) + 1
+            self.released.discard(new_key)
+        if old_key and self.refs.get(old_key, 0) > 0:
+            self.refs[old_key] -= 1
+            if self.refs[old_key] == 0:
+                self.released.add(old_key)
+        return json.dumps(self.refs)
+
+    def rebuild_refs(self, paths):
+        refs = {}
+        for path in paths:
+            key = self._ref_key(path)
+            if key:
+                refs[key] = refs.get(key, 0) + 1
+        self.refs = refs
+        return json.dumps(refs)
+
+    def save_refs(self, refs_json):
+        tmp_path = self.refs_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(refs_json)
+        os.replace(tmp_path, self.refs_path)
+
+    def gc(self, referenced_paths=()):
+        """
+        Delete files released this session that none of referenced_paths
+        (every path the entries hold) still points at, and thumbnails of
+        files that are gone. A count that is merely missing, e.g. after a
+        crash between writes, never deletes anything.
+        """
+        if self.refs is None:
+            return []
+        referenced = {self._ref_key(path) for path in referenced_paths}
+        removed = []
+        for name in sorted(self.released):
+            path = os.path.join(self.root_dir, name)
+            if HASHED_NAME.match(name) and self.refs.get(name, 0) <= 0 and name not in referenced \
+                    and os.path.exists(path):
+                os.remove(path)
+                self.refs.pop(name, None)
+                removed.append(name)
+        self.released.clear()
+        live_thumbs = set()
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if os.path.isfile(path) and not name.startswith("."):
+                live_thumbs.add(os.path.basename(self.thumbnail_path(path)))
+        for name in os.listdir(self.thumbs_dir):
+            if name not in live_thumbs:
+                os.remove(os.path.join(self.thumbs_dir, name))
+        if removed:
+            self.save_refs(json.dumps(self.refs))
+        return removed
+
+    def thumbnail_path(self, path):
+        # Keyed by path + mtime + size so legacy (non-hashed) files get fresh thumbnails when replaced
+        st = os.stat(path)
+        key = hashlib.sha1(f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}".encode("utf-8")).hexdigest()
+        return os.path.join(self.thumbs_dir, key + ".png")
+
+    def load_thumbnail(self, path):
+        """Decoded thumbnail for path, from the on-disk cache when possible. Safe to call off the Tk thread."""
+        from PIL import Image
+        thumb_path = self.thumbnail_path(path)
+        if os.path.exists(thumb_path):
+            thumb = Image.open(thumb_path)
+            thumb.load()
+            return thumb
+        with Image.open(path) as img:
+            img.draft("RGB", THUMB_SIZE)  # lets JPEG decode at reduced scale
+            img.thumbnail(THUMB_SIZE)
+            if img.mode in ("RGB", "RGBA", "L"):
+                thumb = img.copy()
+            else:
+                # PNG can't hold CMYK, YCbCr, 16-bit etc.; keep transparency where there is any
+                has_alpha = "A" in img.getbands() or "transparency" in img.info
+                thumb = img.convert("RGBA" if has_alpha else "RGB")
+        tmp_path = thumb_path + ".tmp"
+        thumb.save(tmp_path, format="PNG")
+        os.replace(tmp_path, thumb_path)
+        return thumb
+
+
+class PhotoCache:
+    """Bounded LRU of Tk PhotoImages, so reopening a window shows its image instantly."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key):
+        photo = self._items.get(key)
+        if photo is not None:
+            self._items.move_to_end(key)
+        return photo
+
+    def put(self, key, photo):
+        self._items[key] = photo
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
@@ -0,0 +1,146 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+
+def profiling_requested(flag, env_var):
+    return flag in sys.argv or os.environ.get(env_var, "") not in ("", "0")
+
+
+class StartupTimer:
+    """
+    Named checkpoints measured from the moment this module was imported
+    (the first thing diary.py does). report() prints the timeline and
+    appends a one-line summary to a log file, so startup regressions show
+    up by comparing runs.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.marks = []
+
+    def mark(self, name):
+        if self.enabled:
+            self.marks.append((name, time.perf_counter() - self.start))
+
+    def report(self, log_path=None):
+        if not self.enabled:
+            return
+        previous = 0.0
+        lines = ["Startup timing (ms since launch / since previous mark):"]
+        for name, elapsed in self.marks:
+            lines.append(f"  {elapsed * 1000:8.1f}  +{(elapsed - previous) * 1000:7.1f}  {name}")
+            previous = elapsed
+        if sys.stderr:  # None in a windowed (console=False) frozen build
+            print("\n".join(lines), file=sys.stderr)
+        if log_path:
+            record = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "frozen": bool(getattr(sys, 'frozen', False)),
+                      "marks": {name: round(elapsed * 1000, 1) for name, elapsed in self.marks}}
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+
+class Profiler:
+    """
+    Opt-in timing of UI handlers. Each handler keeps its last WINDOW
+    durations (with their end times, so call rates such as frames per
+    second can be read back). When a trace path is set every call is also
+    kept as a Chrome trace event ("X" phase), loadable in chrome://tracing
+    or Perfetto. Disabled, a timed handler costs one attribute check.
+    """
+
+    WINDOW = 512
+    MAX_TRACE_EVENTS = 1_000_000
+    BUCKETS_MS = (1, 2, 4, 8, 16, 33, 66, 133, 266)
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_path = None
+        self.samples = {}
+        self.trace = []
+        self._origin = time.perf_counter()
+
+    def configure(self, enabled=False, trace_path=None):
+        self.enabled = bool(enabled or trace_path)
+        self.trace_path = trace_path or None
+
+    def timed(self, name):
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, start, time.perf_counter())
+            return wrapper
+        return decorate
+
+    def record(self, name, start, end):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, deque(maxlen=self.WINDOW))
+        samples.append((end, end - start))
+        if self.trace_path and len(self.trace) < self.MAX_TRACE_EVENTS:
+            self.trace.append({"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                               "ts": round((start - self._origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1)})
+
+    # ---------------- Readouts ----------------
+    def rate(self, name, seconds=1.0):
+        """Calls per second of name over the last `seconds` (frames per second for "present")."""
+        now = time.perf_counter()
+        return sum(1 for end, _ in list(self.samples.get(name, ())) if now - end <= seconds) / seconds
+
+    def stats(self, name):
+        durations = sorted(d for _, d in list(self.samples.get(name, ())))
+        if not durations:
+            return None
+
+        def pct(p):
+            return durations[min(len(durations) - 1, int(p * len(durations)))] * 1000
+
+        return {"count": len(durations), "p50": pct(0.5), "p90": pct(0.9), "p99": pct(0.99),
+                "max": durations[-1] * 1000, "last": self.samples[name][-1][1] * 1000}
+
+    def histogram(self, name):
+        """[(label, count)] over frame-budget-ish millisecond buckets."""
+        counts = [0] * (len(self.BUCKETS_MS) + 1)
+        for _, duration in list(self.samples.get(name, ())):
+            ms = duration * 1000
+            counts[next((i for i, limit in enumerate(self.BUCKETS_MS) if ms < limit), len(self.BUCKETS_MS))] += 1
+        labels = [f"<{self.BUCKETS_MS[0]}"] + [f"{a}-{b}" for a, b in zip(self.BUCKETS_MS, self.BUCKETS_MS[1:])]
+        return list(zip(labels + [f">={self.BUCKETS_MS[-1]}"], counts))
+
+    def report(self):
+        lines = [f"Handler timing (last {self.WINDOW} calls each, ms):"]
+        for name in sorted(self.samples):
+            st = self.stats(name)
+            lines.append(f"  {name:<18} n={st['count']:<4} p50 {st['p50']:7.2f}  p90 {st['p90']:7.2f}"
+                         f"  p99 {st['p99']:7.2f}  max {st['max']:7.2f}")
+            lines.append("      " + "  ".join(f"{label}:{n}" for label, n in self.histogram(name) if n))
+        return "\n".join(lines)
+
+    def close(self):
+        if not self.enabled:
+            return
+        if sys.stderr and self.samples:
+            print(self.report(), file=sys.stderr)
+        if self.trace_path:
+            with open(self.trace_path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": self.trace, "displayTimeUnit": "ms"}, f)
+
+
+# Enabled with `diary.py --profile-startup` or DIARY_PROFILE_STARTUP=1
+STARTUP = StartupTimer(profiling_requested("--profile-startup", "DIARY_PROFILE_STARTUP"))
+
+# Enabled with `diary.py --profile`, DIARY_PROFILE=1 or "profiling": true in config.json;
+# DIARY_TRACE=<file> or "trace_file" in config.json also writes a trace on exit
+PROFILER = Profiler()
+PROFILER.configure(profiling_requested("--profile", "DIARY_PROFILE"), os.environ.get("DIARY_TRACE"))
@@ -0,0 +1,109 @@
+import re
+
+STYLE_TAGS = ("bold", "italic", "underline")
+COLOR_PREFIX = "color_"
+HEX_COLOR = re.compile(r"^#?([0-9a-fA-F]{6})$")
+
+
+def color_tag(text_widget, color):
+    """
+    The one shared tag for a "#rrggbb" color, created on first use, so
+    coloring text a thousand times still leaves a single tag per color.
+    """
+    match = HEX_COLOR.match(color)
+    if not match:
+        return None
+    name = COLOR_PREFIX + match.group(1).lower()
+    if name not in text_widget.tag_names():
+        text_widget.tag_configure(name, foreground="#" + match.group(1).lower())
+    return name
+
+
+def _format_tag(tag):
+    # Older entries were colored with tags named after the color itself
+    if tag in STYLE_TAGS or tag.startswith(COLOR_PREFIX):
+        return tag
+    if HEX_COLOR.match(tag) and tag.startswith("#"):
+        return COLOR_PREFIX + tag[1:].lower()
+    return None
+
+
+def encode_format(text_widget):
+    """
+    Run-length encode the formatting of the whole widget as
+    {"tags": [[...], ...], "runs": [length, combo, length, combo, ...]}:
+    each run is a stretch of characters sharing one combination of tags
+    (combo 0 is plain text). Returns None when nothing is formatted.
+    """
+    combos = {(): 0}
+    runs = []
+    active = set()
+    for key, value, _ in text_widget.dump("1.0", "end-1c", tag=True, text=True):
+        if key == "tagon":
+            tag = _format_tag(value)
+            if tag:
+                active.add(tag)
+        elif key == "tagoff":
+            tag = _format_tag(value)
+            if tag:
+                active.discard(tag)
+        elif key == "text" and value:
+            combo = combos.setdefault(tuple(sorted(active)), len(combos))
+            if runs and runs[-1] == combo:
+                runs[-2] += len(value)
+            else:
+                runs += [len(value), combo]
+    if len(combos) == 1:
+        return None
+    return {"tags": [list(tags) for tags, _ in sorted(combos.items(), key=lambda item: item[1])], "runs": runs}
+
+
+def formatted_pieces(text_widget, text, fmt):
+    """
+    [(chunk, tags), ...] covering text with its encoded formatting, ready
+    to be passed to Text.insert as alternating arguments (one call instead
+    of one tag_add per run). Formatting that doesn't match the text is
+    dropped.
+    """
+    if not fmt or sum(fmt["runs"][::2]) != len(text):
+        return [(text, ())] if text else []
+    combos = []
+    for tags in fmt["tags"]:
+        combo = []
+        for tag in tags:
+            if tag.startswith(COLOR_PREFIX):
+                tag = color_tag(text_widget, "#" + tag[len(COLOR_PREFIX):])
+            if tag:
+                combo.append(tag)
+        combos.append(tuple(combo))
+    pieces = []
+    pos = 0
+    runs = fmt["runs"]
+    for i in range(0, len(runs), 2):
+        length, combo = runs[i], runs[i + 1]
+        pieces.append((text[pos:pos + length], combos[combo]))
+        pos += length
+    return pieces
+
+
+def batch_pieces(pieces, first_chars, batch_chars):
+    """
+    Group pieces into Text.insert argument lists of about first_chars
+    characters for the first batch and batch_chars after that, splitting
+    long chunks where needed.
+    """
+    batches = []
+    args, size, limit = [], 0, first_chars
+    for chunk, tags in pieces:
+        pos = 0
+        while pos < len(chunk):
+            take = chunk[pos:pos + limit - size]
+            args += [take, tags]
+            size += len(take)
+            pos += len(take)
+            if size >= limit:
+                batches.append(args)
+                args, size, limit = [], 0, batch_chars
+    if args:
+        batches.append(args)
+    return batches
@@ -0,0 +1,114 @@
+import os
+import re
+from storage import DirtyMarker, JournalStorage
+
+# Kana, CJK ideographs, half-width katakana and Hangul have no spaces between
+# words, so runs of them are indexed as overlapping character bigrams.
+CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff66-\uff9f\uac00-\ud7af"
+EMOJI = "\u2600-\u27bf\U0001f000-\U0001faff"
+TOKEN_RE = re.compile(
+    rf"(?P<cjk>[{CJK}]+)|(?P<emoji>[{EMOJI}])|(?P<word>(?:(?![{CJK}{EMOJI}])[^\W_])+)"
+)
+BUILT_KEY = "~built"  # marker record: the index has seen every existing entry
+
+
+def tokenize(text, query=False):
+    """
+    Casefolded words, single emoji, and CJK bigrams. Documents also index
+    CJK unigrams so a one-character query still matches; queries use only
+    the (more selective) bigrams when they have them.
+    """
+    tokens = set()
+    for match in TOKEN_RE.finditer(text):
+        if match.group("cjk"):
+            run = match.group("cjk")
+            if len(run) == 1 or not query:
+                tokens.update(run)
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+        elif match.group("emoji"):
+            tokens.add(match.group("emoji"))
+        else:
+            tokens.add(match.group("word").casefold())
+    return tokens
+
+
+class SearchIndex:
+    """
+    Inverted index (token -> dates) over entry text. Each update is one
+    record appended to a journal next to the diary data; the in-memory
+    postings are only built the first time a search is run. Journal writes
+    all go through the background writer; a DirtyMarker makes the next
+    load rebuild from the entries if a session died before its records
+    were written.
+    """
+
+    def __init__(self, path, writer):
+        self.journal = JournalStorage(path)
+        self.dirty = DirtyMarker(os.path.splitext(path)[0] + ".dirty")
+        self.writer = writer
+        self.postings = None
+        self.doc_tokens = None
+
+    @property
+    def built(self):
+        return bool(self.journal.get(BUILT_KEY))
+
+    def load(self, entries):
+        """Build the postings; entries is a callable yielding (date, entry) for a one-time full index."""
+        if self.postings is not None:
+            return
+        self.postings = {}
+        self.doc_tokens = {}
+        if self.built and not self.dirty.found:
+            self.writer.flush()  # updates still queued for the journal must be in it before it is read
+            for date_str, record in self.journal.items():
+                if date_str != BUILT_KEY:
+                    self._add(date_str, set(record["tokens"]))
+            return
+        # First search ever, or the journal may be missing records: index from the
+        # entries, and persist every record in one batch
+        self.dirty.found = False
+        for date_str, entry in entries():
+            self._add(date_str, tokenize(entry.get("text", "")))
+        records = [(date_str, {"tokens": sorted(tokens)}) for date_str, tokens in self.doc_tokens.items()]
+        records.append((BUILT_KEY, {"tokens": ["1"]}))
+        self.writer.submit(("search", BUILT_KEY), lambda: self.journal.put_many(records))
+
+    def _add(self, date_str, tokens):
+        for token in self.doc_tokens.pop(date_str, ()):
+            dates = self.postings.get(token)
+            if dates is not None:
+                dates.discard(date_str)
+                if not dates:
+                    del self.postings[token]
+        self.doc_tokens[date_str] = tokens
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(date_str)
+
+    def _write(self, date_str, tokens):
+        self.journal.put(date_str, {"tokens": sorted(tokens)})
+
+    def update(self, date_str, text):
+        tokens = tokenize(text)
+        if self.doc_tokens is not None:
+            if self.doc_tokens.get(date_str) == tokens:
+                return
+            self._add(date_str, tokens)
+        self.dirty.mark()
+        self.writer.submit(("search", date_str), lambda: self._write(date_str, tokens))
+
+    def search(self, query):
+        """Dates (newest first) whose text contains every token of the query."""
+        tokens = tokenize(query, query=True)
+        if not tokens:
+            return []
+        postings = sorted((self.postings.get(t, set()) for t in tokens), key=len)
+        result = set(postings[0])
+        for dates in postings[1:]:
+            result &= dates
+        return sorted(result, reverse=True)
+
+    def close(self):
+        """Once the writer has flushed everything: the journal matches the entries again."""
+        self.journal.close()
+        self.dirty.clear()
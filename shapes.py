@@ -0,0 +1,75 @@
+import math
+
+
+class Shape:
+    """
+    Outline of a shape tool as a table of unit points, computed once when
+    the module loads. Points are relative to the centre of the dragged
+    box, in box-size units, so placing a shape is one multiply-add per
+    coordinate.
+    """
+
+    def __init__(self, points, curved=False, uniform=False):
+        self.points = tuple(points)
+        self.curved = curved  # smooth outline: drawn as a closed line with rounded joints
+        self.uniform = uniform  # keep the aspect ratio, fitting the smaller side of the box
+
+    def place(self, x1, y1, x2, y2):
+        """[(x, y), ...] of the shape fitted to the box dragged from (x1, y1) to (x2, y2)."""
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        sx, sy = abs(x2 - x1), abs(y2 - y1)
+        if self.uniform:
+            sx = sy = min(sx, sy)
+        return [(cx + sx * x, cy + sy * y) for x, y in self.points]
+
+    def coords(self, x1, y1, x2, y2):
+        """The placed points flattened for Canvas.create_polygon / Canvas.coords."""
+        return [v for point in self.place(x1, y1, x2, y2) for v in point]
+
+
+def star_points(tips=5, inner=0.4):
+    return [(0.5 * (1 if i % 2 == 0 else inner) * math.cos(math.radians(-90 + i * 180 / tips)),
+             0.5 * (1 if i % 2 == 0 else inner) * math.sin(math.radians(-90 + i * 180 / tips)))
+            for i in range(2 * tips)]
+
+
+def heart_points(samples=100):
+    # The classic heart curve, scaled by 1/20 of the box (it reaches a little past the box)
+    points = []
+    for i in range(samples):
+        t = 2 * math.pi * i / samples
+        points.append((16 * math.sin(t) ** 3 / 20,
+                       -(13 * math.cos(t) - 5 * math.cos(2 * t) - 2 * math.cos(3 * t) - math.cos(4 * t)) / 20))
+    return points
+
+
+def polygon_points(sides, rotation=-90):
+    return [(0.5 * math.cos(math.radians(rotation + i * 360 / sides)),
+             0.5 * math.sin(math.radians(rotation + i * 360 / sides)))
+            for i in range(sides)]
+
+
+def speech_bubble_points(radius=0.15, arc_samples=8):
+    """Rounded body over the top three quarters of the box, with a tail down to the bottom-left."""
+    top, bottom, left, right = -0.5, 0.25, -0.5, 0.5
+    corners = ((right - radius, bottom - radius, 0), (left + radius, bottom - radius, 90),
+               (left + radius, top + radius, 180), (right - radius, top + radius, 270))
+    points = []
+    for cx, cy, start in corners:
+        for i in range(arc_samples + 1):
+            angle = math.radians(start + 90 * i / arc_samples)
+            points.append((cx + radius * math.cos(angle), cy + radius * math.sin(angle)))
+        if start == 0:
+            # Bottom edge, right to left, with the tail
+            points += [(-0.05, bottom), (-0.3, 0.5), (-0.2, bottom)]
+    return points
+
+
+SHAPES = {
+    "star": Shape(star_points(), uniform=True),
+    "heart": Shape(heart_points(), curved=True),
+    "triangle": Shape(polygon_points(3)),
+    "hexagon": Shape(polygon_points(6, rotation=0)),
+    "arrow": Shape([(-0.5, -0.15), (0.1, -0.15), (0.1, -0.5), (0.5, 0), (0.1, 0.5), (0.1, 0.15), (-0.5, 0.15)]),
+    "speech bubble": Shape(speech_bubble_points(), curved=True),
+}
@@ -0,0 +1,193 @@
+import bisect
+import json
+from datetime import date, timedelta
+import os
+from storage import DirtyMarker, atomic_write_text
+
+MOODS = ("green", "yellow", "red")
+MOOD_SCORES = {"green": 2, "yellow": 1, "red": 0}
+STREAK_KINDS = ("any",) + MOODS  # "any": days with a mood recorded at all
+STATS_VERSION = 1
+
+
+def day_number(date_str):
+    return date.fromisoformat(date_str).toordinal()
+
+
+class Runs:
+    """Sorted, non-overlapping [first, last] day-number intervals; adding or removing a day touches at most two."""
+
+    def __init__(self, runs=None):
+        self.starts = [r[0] for r in runs or []]
+        self.ends = [r[1] for r in runs or []]
+
+    def _find(self, day):
+        i = bisect.bisect_right(self.starts, day) - 1
+        return i if i >= 0 and self.ends[i] >= day else None
+
+    def add(self, day):
+        if self._find(day) is not None:
+            return
+        i = bisect.bisect_left(self.starts, day)
+        joins_prev = i > 0 and self.ends[i - 1] == day - 1
+        joins_next = i < len(self.starts) and self.starts[i] == day + 1
+        if joins_prev and joins_next:
+            self.ends[i - 1] = self.ends.pop(i)
+            del self.starts[i]
+        elif joins_prev:
+            self.ends[i - 1] = day
+        elif joins_next:
+            self.starts[i] = day
+        else:
+            self.starts.insert(i, day)
+            self.ends.insert(i, day)
+
+    def remove(self, day):
+        i = self._find(day)
+        if i is None:
+            return
+        start, end = self.starts[i], self.ends[i]
+        if start == end:
+            del self.starts[i], self.ends[i]
+        elif day == start:
+            self.starts[i] = day + 1
+        elif day == end:
+            self.ends[i] = day - 1
+        else:
+            self.ends[i] = day - 1
+            self.starts.insert(i + 1, day + 1)
+            self.ends.insert(i + 1, end)
+
+    def longest(self):
+        return max((e - s + 1 for s, e in zip(self.starts, self.ends)), default=0)
+
+    def current(self, today):
+        # A streak is still alive if it reaches today or yesterday (today may not be written yet)
+        for day in (today, today - 1):
+            i = self._find(day)
+            if i is not None:
+                return day - self.starts[i] + 1
+        return 0
+
+    def to_list(self):
+        return [[s, e] for s, e in zip(self.starts, self.ends)]
+
+
+class MoodStats:
+    """
+    Mood aggregates kept up to date one save at a time: counts per mood
+    for every month and year, streak intervals per mood, and the day ->
+    mood map the rolling averages are read from. Everything is persisted
+    to one small JSON file, so the stats view never has to walk the
+    diary entries. A DirtyMarker covers the window between an entry save
+    and the stats write after it: the file is rebuilt if a session died
+    there.
+    """
+
+    def __init__(self, path, writer):
+        self.path = path
+        self.writer = writer
+        self.dirty = DirtyMarker(os.path.splitext(path)[0] + ".dirty")
+        self.days = None
+        self.version = 0  # bumped on every change, for caches of derived views
+
+    def load(self, entries):
+        """Read the stats file; entries is a callable yielding (date, entry), used if it is missing or stale."""
+        if self.days is not None:
+            return
+        try:
+            if self.dirty.found:
+                raise ValueError("last session ended between an entry save and the stats write")
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != STATS_VERSION:
+                raise ValueError("stats version")
+        except (FileNotFoundError, ValueError):
+            data = None
+        if data is not None:
+            self.days = data["days"]
+            self.months = data["months"]
+            self.years = data["years"]
+            self.runs = {kind: Runs(data["runs"].get(kind)) for kind in STREAK_KINDS}
+            return
+        self.days, self.months, self.years = {}, {}, {}
+        self.runs = {kind: Runs() for kind in STREAK_KINDS}
+        for date_str, entry in entries():
+            self._apply(date_str, entry.get("color"))
+        self._save()
+
+    def _bump(self, table, key, color, delta):
+        counts = table.setdefault(key, {})
+        counts[color] = counts.get(color, 0) + delta
+        if counts[color] <= 0:
+            del counts[color]
+            if not counts:
+                del table[key]
+
+    def _apply(self, date_str, color):
+        color = color if color in MOOD_SCORES else None
+        old = self.days.get(date_str)
+        if old == color:
+            return False
+        day = day_number(date_str)
+        if old:
+            del self.days[date_str]
+            self._bump(self.months, date_str[:7], old, -1)
+            self._bump(self.years, date_str[:4], old, -1)
+            self.runs[old].remove(day)
+            self.runs["any"].remove(day)
+        if color:
+            self.days[date_str] = color
+            self._bump(self.months, date_str[:7], color, 1)
+            self._bump(self.years, date_str[:4], color, 1)
+            self.runs[color].add(day)
+            self.runs["any"].add(day)
+        self.version += 1
+        return True
+
+    def record(self, date_str, color):
+        """Fold one saved entry's mood into the aggregates. Call before the entry itself is queued."""
+        if self._apply(date_str, color):
+            self.dirty.mark()
+            self._save()
+
+    def _save(self):
+        text = json.dumps({"version": STATS_VERSION, "days": self.days, "months": self.months,
+                           "years": self.years, "runs": {k: r.to_list() for k, r in self.runs.items()}})
+        self.writer.submit(("stats",), lambda: atomic_write_text(self.path, text))
+
+    def close(self):
+        """Once the writer has flushed everything: the stats file matches the entries again."""
+        self.dirty.clear()
+
+    # ---------------- Queries ----------------
+    def month_counts(self, year, month):
+        return dict(self.months.get(f"{year}-{month:02d}", {}))
+
+    def year_counts(self, year):
+        return dict(self.years.get(str(year), {}))
+
+    def year_list(self):
+        return sorted(self.years, reverse=True)
+
+    @staticmethod
+    def average(counts):
+        total = sum(counts.values())
+        if not total:
+            return None
+        return sum(MOOD_SCORES[c] * n for c, n in counts.items()) / total
+
+    def rolling_average(self, days, today=None):
+        """Mean mood score (red 0, yellow 1, green 2) over the last `days` days that have a mood."""
+        today = today or date.today()
+        counts = {}
+        for i in range(days):
+            color = self.days.get((today - timedelta(days=i)).isoformat())
+            if color:
+                counts[color] = counts.get(color, 0) + 1
+        return self.average(counts)
+
+    def streaks(self, today=None):
+        """{kind: (current, longest)} for "any" and each mood."""
+        today = (today or date.today()).toordinal()
+        return {kind: (runs.current(today), runs.longest()) for kind, runs in self.runs.items()}
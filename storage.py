@@ -0,0 +1,421 @@
+import json
+import os
+import sqlite3
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+
+def atomic_write_text(path, text):
+    """
+    Write text to path via a temp file + rename so readers never see a
+    half-written file, even if the process dies mid-write.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class DirtyMarker:
+    """
+    A file that exists while data derived from the entries (stats, search
+    postings) may be behind them: created before the first change of a
+    session reaches the writer, removed on a clean exit once every queued
+    write is on disk. Finding it at startup means the last session died in
+    between, so the derived data must be rebuilt from the entries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.found = os.path.exists(path)
+        self._exists = self.found
+
+    def mark(self):
+        if not self._exists:
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self._exists = True
+
+    def clear(self):
+        if self._exists:
+            os.remove(self.path)
+            self._exists = False
+        self.found = False
+
+
+def locked(method):
+    # Backends are read from the Tk thread and written from the background writer
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def load_legacy_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+# ---------------- Legacy JSON backend ----------------
+class JsonStorage:
+    """Whole diary kept in one JSON file, rewritten on every save."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._data = load_legacy_json(path)
+
+    @locked
+    def get(self, date_str):
+        return dict(self._data.get(date_str, {}))
+
+    @locked
+    def put(self, date_str, entry):
+        self._data[date_str] = dict(entry)
+        atomic_write_text(self.path, json.dumps(self._data, indent=4))
+
+    @locked
+    def month_colors(self, year, month):
+        prefix = f"{year}-{month:02d}-"
+        return {d: e.get("color") for d, e in self._data.items() if d.startswith(prefix) and e.get("color")}
+
+    def items(self):
+        with self._lock:
+            snapshot = sorted(self._data.items())
+        for date_str, entry in snapshot:
+            yield date_str, dict(entry)
+
+    def close(self):
+        pass
+
+
+# ---------------- Append-only journal backend ----------------
+class JournalStorage:
+    """
+    Append-only log of per-date records, one JSON object per line.
+
+    Saving a day appends a single line (cost proportional to that entry),
+    later records for the same date win. A torn trailing line left by a
+    crash is dropped on open. Once superseded records outnumber live ones
+    the log is compacted into a fresh file and swapped in atomically.
+
+    Only a small index (date -> byte offset, length, mood color) is kept in
+    memory and persisted next to the log, so opening the diary doesn't parse
+    any entry text. Entries are read from disk on demand through a small
+    LRU cache.
+    """
+
+    COMPACT_MIN_DEAD = 64
+    CACHE_SIZE = 64
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".idx"
+        self._lock = threading.RLock()
+        self._index = {}
+        self._months = {}  # "YYYY-MM" -> {date: color}, for month_colors()
+        self._index_saved = True  # False once records are appended after the last _save_index()
+        self._cache = OrderedDict()
+        self._dead = 0
+        self._generation = 0
+        self._file = None
+        if not os.path.exists(path):
+            # One-time import of the old whole-file diary
+            legacy = load_legacy_json(legacy_path) if legacy_path else {}
+            records = [(d, (json.dumps({"date": d, "entry": e}, ensure_ascii=False) + "\n").encode("utf-8"))
+                       for d, e in sorted(legacy.items())]
+            self._write_log(records, {d: e.get("color") or "" for d, e in legacy.items()})
+        elif not self._load_index():
+            self._index = {}
+            self._months = {}
+            self._dead = 0
+            self._scan(0)
+        self._file = open(self.path, "ab")
+        self._reader = open(self.path, "rb")
+        if self._needs_compaction():
+            self.compact()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if saved.get("generation") != self._read_generation() or saved.get("size", 0) > os.path.getsize(self.path):
+            return False
+        self._index = saved["index"]
+        self._generation = saved["generation"]
+        self._dead = saved.get("dead", 0)
+        self._build_months()
+        self._scan(saved["size"])  # pick up records appended after the index was written
+        return True
+
+    def _read_generation(self):
+        with open(self.path, "rb") as f:
+            first = f.readline()
+        try:
+            return json.loads(first).get("generation", 0)
+        except ValueError:
+            return 0
+
+    def _scan(self, offset):
+        good_end = offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # torn write from a crash
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    break
+                if "generation" in record:
+                    self._generation = record["generation"]
+                else:
+                    self._remember(record["date"], good_end, len(raw), record["entry"])
+                good_end += len(raw)
+        if good_end != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+
+    def _build_months(self):
+        self._months = {}
+        for date_str, rec in self._index.items():
+            if rec[2]:
+                self._months.setdefault(date_str[:7], {})[date_str] = rec[2]
+
+    def _remember(self, date_str, offset, length, entry):
+        if date_str in self._index:
+            self._dead += 1
+        color = entry.get("color") or ""
+        self._index[date_str] = [offset, length, color]
+        month = self._months.setdefault(date_str[:7], {})
+        if color:
+            month[date_str] = color
+        else:
+            month.pop(date_str, None)
+        self._index_saved = False
+        self._cache.pop(date_str, None)
+
+    def _needs_compaction(self):
+        return self._dead >= max(self.COMPACT_MIN_DEAD, len(self._index))
+
+    def _read_raw(self, date_str):
+        offset, length, _ = self._index[date_str]
+        self._reader.seek(offset)
+        return self._reader.read(length)
+
+    @locked
+    def get(self, date_str):
+        if date_str not in self._index:
+            return {}
+        entry = self._cache.get(date_str)
+        if entry is None:
+            entry = json.loads(self._read_raw(date_str))["entry"]
+            self._cache[date_str] = entry
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(date_str)
+        return dict(entry)
+
+    @locked
+    def put(self, date_str, entry):
+        self._append([(date_str, entry)])
+        if self._needs_compaction():
+            self.compact()
+
+    @locked
+    def put_many(self, items):
+        """Append many (date, entry) records with one write and one fsync, then save the index."""
+        self._append(items)
+        if self._needs_compaction():
+            self.compact()
+        else:
+            self._save_index()
+
+    def _append(self, items):
+        records = []
+        for date_str, entry in items:
+            entry = dict(entry)
+            records.append((date_str, entry, (json.dumps({"date": date_str, "entry": entry}, ensure_ascii=False) + "\n").encode("utf-8")))
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        self._file.write(b"".join(line for _, _, line in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        for date_str, entry, line in records:
+            self._remember(date_str, offset, len(line), entry)
+            offset += len(line)
+
+    @locked
+    def month_colors(self, year, month):
+        return dict(self._months.get(f"{year}-{month:02d}", {}))
+
+    def items(self):
+        with self._lock:
+            dates = sorted(self._index)
+        for date_str in dates:
+            yield date_str, self.get(date_str)
+
+    @locked
+    def compact(self):
+        # Live records are copied as raw bytes, no entry text is re-parsed
+        records = [(d, self._read_raw(d)) for d in sorted(self._index)]
+        colors = {d: rec[2] for d, rec in self._index.items()}
+        self._write_log(records, colors)
+
+    def _write_log(self, records, colors):
+        self._generation += 1
+        header = (json.dumps({"generation": self._generation}) + "\n").encode("utf-8")
+        index = {}
+        offset = len(header)
+        for date_str, raw in records:
+            index[date_str] = [offset, len(raw), colors[date_str]]
+            offset += len(raw)
+        for handle in (self._file, getattr(self, "_reader", None)):
+            if handle:
+                handle.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            for _, raw in records:
+                f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._index = index
+        self._build_months()
+        self._dead = 0
+        self._cache.clear()
+        if self._file:
+            self._file = open(self.path, "ab")
+            self._reader = open(self.path, "rb")
+        self._save_index()
+
+    def _save_index(self):
+        saved = {"generation": self._generation, "size": os.path.getsize(self.path),
+                 "dead": self._dead, "index": self._index}
+        atomic_write_text(self.index_path, json.dumps(saved))
+        self._index_saved = True
+
+    @locked
+    def close(self):
+        self._file.close()
+        self._reader.close()
+        if not self._index_saved:
+            self._save_index()
+
+
+# ---------------- SQLite backend ----------------
+class SqliteStorage:
+    """
+    Entries in an SQLite table keyed (and indexed) by date, with a column
+    per known field. Unknown fields are kept as JSON in "extra".
+    """
+
+    COLUMNS = ("color", "text", "image_path", "drawing_path")
+
+    def __init__(self, path, migrate_from=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "date TEXT PRIMARY KEY, color TEXT, text TEXT, "
+                "image_path TEXT, drawing_path TEXT, extra TEXT)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        migrated = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+        if not migrated and migrate_from:
+            self._migrate(migrate_from())
+
+    def _migrate(self, source):
+        # One-time import, done in a single transaction
+        with self._conn:
+            for date_str, entry in source.items():
+                self._conn.execute(self._UPSERT, self._row(date_str, entry))
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', '1')")
+        source.close()
+
+    _UPSERT = (
+        "INSERT INTO entries (date, color, text, image_path, drawing_path, extra) "
+        "VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(date) DO UPDATE SET color = excluded.color, text = excluded.text, "
+        "image_path = excluded.image_path, drawing_path = excluded.drawing_path, extra = excluded.extra"
+    )
+
+    def _row(self, date_str, entry):
+        extra = {k: v for k, v in entry.items() if k not in self.COLUMNS}
+        return (date_str,) + tuple(entry.get(k) for k in self.COLUMNS) + (json.dumps(extra) if extra else None,)
+
+    def _entry(self, row):
+        entry = {k: v for k, v in zip(self.COLUMNS, row[1:5]) if v is not None}
+        if row[5]:
+            entry.update(json.loads(row[5]))
+        return entry
+
+    @locked
+    def get(self, date_str):
+        row = self._conn.execute(
+            "SELECT date, color, text, image_path, drawing_path, extra FROM entries WHERE date = ?", (date_str,)
+        ).fetchone()
+        return self._entry(row) if row else {}
+
+    @locked
+    def put(self, date_str, entry):
+        with self._conn:
+            self._conn.execute(self._UPSERT, self._row(date_str, entry))
+
+    @locked
+    def month_colors(self, year, month):
+        first = f"{year}-{month:02d}-01"
+        last = f"{year}-{month:02d}-31"
+        rows = self._conn.execute(
+            "SELECT date, color FROM entries WHERE date BETWEEN ? AND ? AND color != ''", (first, last)
+        )
+        return dict(rows)
+
+    def items(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, color, text, image_path, drawing_path, extra FROM entries ORDER BY date"
+            ).fetchall()
+        for row in rows:
+            yield row[0], self._entry(row)
+
+    @locked
+    def close(self):
+        self._conn.close()
+
+
+STORAGE_BACKENDS = {
+    "journal": lambda entries_dir: JournalStorage(os.path.join(entries_dir, "diary_data.jsonl"),
+                                                  legacy_path=os.path.join(entries_dir, "diary_data.json")),
+    "json": lambda entries_dir: JsonStorage(os.path.join(entries_dir, "diary_data.json")),
+    "sqlite": lambda entries_dir: SqliteStorage(os.path.join(entries_dir, "diary_data.sqlite3"),
+                                                migrate_from=lambda: _migration_source(entries_dir)),
+}
+
+
+def _migration_source(entries_dir):
+    # Prefer the journal if the diary has been used with it, else the old JSON file
+    if os.path.exists(os.path.join(entries_dir, "diary_data.jsonl")):
+        return STORAGE_BACKENDS["journal"](entries_dir)
+    return STORAGE_BACKENDS["json"](entries_dir)
+
+
+def open_storage(kind, entries_dir):
+    os.makedirs(entries_dir, exist_ok=True)
+    factory = STORAGE_BACKENDS.get(kind, STORAGE_BACKENDS["journal"])
+    return factory(entries_dir)
@@ -0,0 +1,83 @@
+import math
+import time
+
+FRAME_MS = 16  # ~60 Hz: at most one rasterize + display update per frame
+
+
+def catmull_rom(p0, p1, p2, p3, steps):
+    """Points on the (uniform) Catmull-Rom curve from p1 to p2, excluding p1."""
+    points = []
+    for i in range(1, steps + 1):
+        t = i / steps
+        t2, t3 = t * t, t * t * t
+        points.append(tuple(
+            0.5 * (2 * b + (c - a) * t + (2 * a - 5 * b + 4 * c - d) * t2 + (3 * b - a - 3 * c + d) * t3)
+            for a, b, c, d in zip(p0, p1, p2, p3)))
+    return points
+
+
+def segment_steps(p1, p2, spacing=3, max_steps=32):
+    return max(1, min(max_steps, int(math.dist(p1, p2) // spacing)))
+
+
+class StrokeEngine:
+    """
+    Collects pointer samples for one brush stroke and rasterizes them in
+    batches, at most once per frame. Samples are joined by a Catmull-Rom
+    spline; a segment is drawn once the sample after it is known (the
+    curve through a point depends on its neighbours), and the last one
+    when the stroke ends. rasterize(points) receives each batch as a
+    polyline that starts where the previous batch ended.
+    """
+
+    def __init__(self, widget, rasterize):
+        self.widget = widget
+        self.rasterize = rasterize
+        self.samples = []
+        self.drawn = 0  # index of the sample the drawn curve has reached
+        self.flush_after = None
+        self.last_flush = 0.0
+
+    def begin(self, point):
+        self.cancel()
+        self.samples = [point]
+        self.drawn = 0
+
+    def add(self, point):
+        if not self.samples or point == self.samples[-1]:
+            return
+        self.samples.append(point)
+        if self.flush_after is None:
+            wait = FRAME_MS - (time.perf_counter() - self.last_flush) * 1000
+            self.flush_after = self.widget.after(max(0, int(wait)), self.flush)
+
+    def _curve(self, end):
+        s = self.samples
+        points = [s[self.drawn]]
+        for i in range(self.drawn, end):
+            p0 = s[i - 1] if i > 0 else s[i]
+            p3 = s[i + 2] if i + 2 < len(s) else s[i + 1]
+            points += catmull_rom(p0, s[i], s[i + 1], p3, segment_steps(s[i], s[i + 1]))
+        self.drawn = end
+        return points
+
+    def flush(self, final=False):
+        self.flush_after = None
+        self.last_flush = time.perf_counter()
+        end = len(self.samples) - 1 if final else len(self.samples) - 2
+        if end > self.drawn:
+            self.rasterize(self._curve(end))
+
+    def end(self):
+        """Draw everything still queued, including the last segment (or a dot for a click)."""
+        self.cancel()
+        if len(self.samples) == 1:
+            self.rasterize(self.samples[:1])
+        elif self.samples:
+            self.flush(final=True)
+        self.samples = []
+
+    def cancel(self):
+        if self.flush_after is not None:
+            self.widget.after_cancel(self.flush_after)
+            self.flush_after = None